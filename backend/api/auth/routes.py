@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify
-from utils.auth import generate_token
+from utils.auth import generate_token, token_required, get_request_token, revoke_token
 from config.auth import ADMIN_USERNAME, ADMIN_PASSWORD
 
 # 创建蓝图
@@ -29,6 +29,15 @@ def login():
     
     return jsonify({'success': False, 'message': '用户名或密码错误'}), 401
 
+# 登出API，吊销当前 token
+@auth_bp.route('/logout', methods=['POST'])
+@token_required
+def logout(current_user):
+    success, message = revoke_token(get_request_token())
+    if not success:
+        return jsonify({'success': False, 'message': message}), 500
+    return jsonify({'success': True, 'message': message})
+
 # 测试路由
 @auth_bp.route('/test', methods=['GET'])
 def test():
@@ -0,0 +1,3 @@
+from .routes import metrics_bp
+
+__all__ = ['metrics_bp']
@@ -0,0 +1,23 @@
+import os
+from flask import Blueprint, jsonify
+from utils.auth import token_required, get_token_cache_stats
+from utils.database import get_pool_stats
+from utils.emby_client import get_emby_client
+from utils.logger import get_log_stats
+from services.user_service import user_directory
+
+# 创建蓝图
+metrics_bp = Blueprint('metrics', __name__, url_prefix='/metrics')
+
+# 获取当前 worker 进程的运行指标
+@metrics_bp.route('', methods=['GET'])
+@token_required
+def get_metrics(current_user):
+    return jsonify({
+        'pid': os.getpid(),
+        'database': get_pool_stats(),
+        'user_directory': user_directory.stats(),
+        'emby': get_emby_client().stats(),
+        'auth': get_token_cache_stats(),
+        'logging': get_log_stats()
+    })
@@ -3,9 +3,8 @@ import subprocess
 import os
 import threading
 import time
-import datetime
 from utils.auth import token_required
-from utils.logger import Logger
+from utils.logger import Logger, get_plugin_log_dir, get_latest_log_file, dated_log_file
 
 # 创建日志记录器
 logger = Logger('plugins')
@@ -101,12 +100,9 @@ def get_plugin_logs(current_user, plugin_name):
         if plugin_name not in plugin_log_files:
             return jsonify({'success': False, 'message': f'插件 {plugin_name} 不存在'}), 404
         
-        # 日志文件路径
-        log_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'logs')
-        # 获取当前日期的日志文件
-        current_date = datetime.datetime.now().strftime('%Y-%m-%d')
+        # 获取最新的日志文件（今天还没有日志时使用最近一天的日志），日志目录与 Logger 一致（LOG_DIR）
         log_file_name = plugin_log_files[plugin_name]
-        log_file = os.path.join(log_dir, 'plugins', log_file_name, f'{log_file_name}-{current_date}.log')
+        log_file = get_latest_log_file(get_plugin_log_dir(log_file_name), log_file_name)
         
         # 读取日志内容
         if os.path.exists(log_file):
@@ -157,26 +153,32 @@ def get_plugin_logs_sse(plugin_name):
                 yield f"data: 插件 {plugin_name} 不存在\n\n"
             return Response(generate_error(), content_type='text/event-stream')
         
-        # 日志文件路径
-        log_dir = os.path.join(os.path.dirname(__file__), '..', '..', 'logs')
-        # 获取当前日期的日志文件
-        current_date = datetime.datetime.now().strftime('%Y-%m-%d')
+        # 日志目录与 Logger 一致（LOG_DIR）
         log_file_name = plugin_log_files[plugin_name]
-        log_file = os.path.join(log_dir, 'plugins', log_file_name, f'{log_file_name}-{current_date}.log')
+        plugin_log_dir = get_plugin_log_dir(log_file_name)
+        log_file = dated_log_file(plugin_log_dir, log_file_name)
         
         # 确保日志文件存在
         if not os.path.exists(log_file):
             # 创建空日志文件
-            os.makedirs(log_dir, exist_ok=True)
-            with open(log_file, 'w', encoding='utf-8') as f:
+            os.makedirs(plugin_log_dir, exist_ok=True)
+            with open(log_file, 'a', encoding='utf-8') as f:
                 f.write('')
         
         def generate():
+            nonlocal log_file
             # 读取文件的当前位置
             file_position = 0
             
             while True:
                 try:
+                    # 跨过零点后，读完前一天文件的剩余内容再切换到新一天的文件
+                    current_file = dated_log_file(plugin_log_dir, log_file_name)
+                    if current_file != log_file and os.path.exists(current_file):
+                        if not os.path.exists(log_file) or os.path.getsize(log_file) <= file_position:
+                            log_file = current_file
+                            file_position = 0
+                    
                     # 检查文件是否存在
                     if not os.path.exists(log_file):
                         yield f"data: 日志文件不存在\n\n"
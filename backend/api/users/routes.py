@@ -1,6 +1,11 @@
-from flask import Blueprint, request, jsonify
+import zlib
+import hashlib
+import datetime
+from flask import Blueprint, request, jsonify, current_app, Response
+from config.users import user_config
+from utils.cache import TTLCache
 from utils.auth import token_required
-from services.user_service import sync_users, get_users, create_user, update_user, update_user_status, delete_user, check_expire
+from services.user_service import sync_users, get_users, get_users_by_cursor, get_users_version, iter_users_export, EXPORT_FORMATS, create_user, update_user, update_user_status, delete_user, check_expire, bulk_update_users, parse_user_ids, parse_import_rows, import_users
 
 # 创建蓝图
 users_bp = Blueprint('users', __name__, url_prefix='')
@@ -9,28 +14,79 @@ users_bp = Blueprint('users', __name__, url_prefix='')
 @users_bp.route('/sync', methods=['POST'])
 @token_required
 def sync_users_route(current_user):
-    success, message = sync_users()
+    # mode=full 时对每个用户单独请求详情
+    full_fetch = request.args.get('mode') == 'full'
+    success, message = sync_users(full_fetch)
     if success:
         return jsonify({'success': True, 'message': message})
     else:
         return jsonify({'success': False, 'message': message}), 500
 
+def build_users_payload(args):
+    """
+    根据查询参数生成用户列表响应
+    :param args: 请求查询参数
+    :return: (响应数据, 状态码)
+    """
+    # 获取搜索参数
+    search_query = args.get('search', '')
+    status_filter = args.get('status', None)
+    expire_status = args.get('expire_status', None)
+    
+    # 获取分页参数
+    page_size = int(args.get('page_size', 10))
+    # 总数统计方式：exact 每次统计，cached 使用短时间缓存，none 不统计
+    total_mode = args.get('total')
+    if total_mode not in (None, 'exact', 'cached', 'none'):
+        return {'success': False, 'message': 'total 参数只能是 exact、cached 或 none'}, 400
+    
+    # 携带 cursor 参数（第一页传空值）时使用游标分页
+    if 'cursor' in args:
+        try:
+            result = get_users_by_cursor(search_query, status_filter, expire_status, args.get('cursor'), page_size, total_mode or 'cached')
+        except ValueError as e:
+            return {'success': False, 'message': str(e)}, 400
+        except Exception as e:
+            return {'success': False, 'message': f'获取用户列表失败: {e}'}, 500
+        return {'success': True, 'data': result['data'], 'total': result['total'], 'page_size': result['page_size'], 'next_cursor': result['next_cursor'], 'prev_cursor': result['prev_cursor']}, 200
+    
+    page = int(args.get('page', 1))
+    # 查询出错时返回 500，非 200 的响应不会被缓存
+    try:
+        result = get_users(search_query, status_filter, expire_status, page, page_size, total_mode or 'exact')
+    except Exception as e:
+        return {'success': False, 'message': f'获取用户列表失败: {e}'}, 500
+    return {'success': True, 'data': result['data'], 'total': result['total'], 'page': result['page'], 'page_size': result['page_size']}, 200
+
+# 用户列表响应缓存，key 为 (数据版本号, 查询参数)，数据变化后版本号递增，旧的缓存不会再被命中
+_list_cache = TTLCache(maxsize=user_config['list_cache_maxsize'])
+
+def render_users_list(args):
+    body_data, status = build_users_payload(args)
+    body = current_app.json.dumps(body_data).encode('utf-8')
+    return body, status, hashlib.sha1(body).hexdigest()
+
 # 获取所有用户
 @users_bp.route('', methods=['GET'])
 @token_required
 def get_users_route(current_user):
     try:
-        # 获取搜索参数
-        search_query = request.args.get('search', '')
-        status_filter = request.args.get('status', None)
-        expire_status = request.args.get('expire_status', None)
+        version = get_users_version()
+        key = (version, tuple(sorted(request.args.items(multi=True))))
+        # 过期状态筛选的结果会随时间变化而数据版本号不变，只做短时间缓存
+        ttl = user_config['list_cache_ttl']
+        if request.args.get('expire_status') in ('active', 'expired'):
+            ttl = min(ttl, user_config['list_cache_expire_ttl'])
         
-        # 获取分页参数
-        page = int(request.args.get('page', 1))
-        page_size = int(request.args.get('page_size', 10))
+        body, status, etag = _list_cache.get_or_load(key, lambda: render_users_list(request.args), ttl, cacheable=lambda item: item[1] == 200)
+        response = current_app.response_class(body, status=status, mimetype='application/json')
+        if status != 200:
+            return response
         
-        result = get_users(search_query, status_filter, expire_status, page, page_size)
-        return jsonify({'success': True, 'data': result['data'], 'total': result['total'], 'page': result['page'], 'page_size': result['page_size']})
+        # ETag 取响应内容的摘要，客户端携带 If-None-Match 且内容未变化时返回 304
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -93,6 +149,117 @@ def delete_user_route(current_user, user_id):
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+# 批量操作用户
+@users_bp.route('/bulk', methods=['POST'])
+@token_required
+def bulk_users_route(current_user):
+    try:
+        data = request.json or {}
+        # 在执行任何操作前校验ID列表，避免字符串等被逐字符解析为用户ID
+        try:
+            user_ids = parse_user_ids(data.get('ids', []))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
+        success, result = bulk_update_users(
+            user_ids,
+            data.get('action'),
+            expire_date=data.get('expire_date'),
+            days=data.get('days')
+        )
+        if success:
+            message = f"批量操作完成：成功 {result['success_count']} 个，失败 {result['failed_count']} 个"
+            return jsonify({'success': True, 'message': message, 'data': result})
+        else:
+            return jsonify({'success': False, 'message': result}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+# 批量导入用户，支持 JSON（数组或 {"users": [...]}）、CSV 请求体（Content-Type: text/csv）或上传 CSV/JSON 文件（字段名 file）
+@users_bp.route('/import', methods=['POST'])
+@token_required
+def import_users_route(current_user):
+    try:
+        upload = request.files.get('file')
+        try:
+            if upload:
+                content_type = 'csv' if upload.filename.lower().endswith('.csv') else 'json'
+                rows = parse_import_rows(upload.read(), content_type)
+            elif 'csv' in (request.content_type or ''):
+                rows = parse_import_rows(request.get_data(), 'csv')
+            else:
+                rows = parse_import_rows(request.get_json(silent=True))
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'导入数据格式错误: {e}'}), 400
+        
+        success, result = import_users(rows)
+        if success:
+            message = f"导入完成：创建 {result['created_count']} 个，接管 {result['adopted_count']} 个，跳过 {result['skipped_count']} 个，失败 {result['failed_count']} 个"
+            return jsonify({'success': True, 'message': message, 'data': result})
+        else:
+            return jsonify({'success': False, 'message': result}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+def gzip_chunks(chunks, level=6):
+    """
+    流式 gzip 压缩
+    :param chunks: 原始数据块生成器
+    :param level: 压缩级别
+    :return: 生成器，逐块返回压缩后的数据
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        chunks.close()
+
+# 流式导出用户，筛选参数与用户列表相同
+@users_bp.route('/export', methods=['GET'])
+@token_required
+def export_users_route(current_user):
+    try:
+        export_format = request.args.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'success': False, 'message': f"format 参数只能是 {'、'.join(EXPORT_FORMATS)}"}), 400
+        use_gzip = request.args.get('gzip', 'false').lower() == 'true'
+        
+        chunks = iter_users_export(
+            export_format,
+            request.args.get('search', ''),
+            request.args.get('status', None),
+            request.args.get('expire_status', None)
+        )
+        # 先取第一块数据，连接或查询出错时仍可以返回错误状态码
+        first_chunk = next(chunks, b'')
+        
+        def generate():
+            try:
+                yield first_chunk
+                yield from chunks
+            finally:
+                chunks.close()
+        
+        body = generate()
+        filename = f"users-{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+        mimetype = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+        if use_gzip:
+            body = gzip_chunks(body)
+            filename += '.gz'
+            mimetype = 'application/gzip'
+        
+        response = Response(body, mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+        response.headers['Cache-Control'] = 'no-store'
+        # 避免 nginx 等反向代理缓冲整个响应
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 # 检查用户有效期并禁用过期用户
 @users_bp.route('/check-expire', methods=['POST'])
 @token_required
@@ -15,11 +15,15 @@ if os.path.exists(env_path):
 
 app = Flask(__name__)
 
+# 使用基于 orjson 的 JSON 序列化，日期时间原生编码为 ISO 8601 格式
+from utils.json_provider import FastJSONProvider
+app.json = FastJSONProvider(app)
+
 # 配置CORS，允许所有跨域请求
 CORS(app, resources={r"/api/*": {"origins": "*", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization"]}})
 
 # 导入数据库初始化
-from utils.database import init_db
+from utils.database import init_db, init_db_teardown
 
 # 导入各个模块的蓝图
 from api.auth import auth_bp
@@ -27,6 +31,7 @@ from api.users import users_bp
 from api.emby import emby_bp
 from api.plugins import plugins_bp
 from api.logs import logs_bp
+from api.metrics import metrics_bp
 
 # 注册蓝图，为每个模块设置具体的前缀，方便统一管理
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -34,9 +39,21 @@ app.register_blueprint(users_bp, url_prefix='/api/users')
 app.register_blueprint(emby_bp, url_prefix='/api/emby')
 app.register_blueprint(plugins_bp, url_prefix='/api/plugins')
 app.register_blueprint(logs_bp, url_prefix='/api/logs')
+app.register_blueprint(metrics_bp, url_prefix='/api/metrics')
+
+# 请求结束时归还数据库连接
+init_db_teardown(app)
 
 # 初始化数据库
 init_db()
 
+# 启动 Emby 后台健康检查
+from services.emby_service import start_emby_health_monitor
+start_emby_health_monitor()
+
+# 启动过期调度器（多个 worker 中只有一个会成为主节点执行调度）
+from services.expire_service import start_expire_scheduler
+start_expire_scheduler()
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
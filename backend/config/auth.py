@@ -4,3 +4,7 @@ import os
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-here')
 ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'admin')
 ADMIN_PASSWORD = os.getenv('ADMIN_PASSWORD', 'admin123')
+
+# 已验证 token 缓存：最大条目数，以及检查吊销列表（登出）的间隔（秒）
+TOKEN_CACHE_MAXSIZE = int(os.getenv('TOKEN_CACHE_MAXSIZE', '1024'))
+TOKEN_REVOCATION_CHECK_INTERVAL = float(os.getenv('TOKEN_REVOCATION_CHECK_INTERVAL', '1'))
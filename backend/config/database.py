@@ -8,3 +8,16 @@ db_config = {
     'password': os.getenv('DB_PASSWORD', 'password'),
     'database': os.getenv('DB_NAME', 'emby_manager')
 }
+
+# 数据库连接池配置（每个 gunicorn worker 进程一个连接池）
+pool_config = {
+    # 连接池最小和最大连接数，启动时预先建立最小数量的连接
+    'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '1')),
+    'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+    # 连接最长使用时间（秒），超过后在取出时重建，应小于 MySQL 的 wait_timeout
+    'max_age': float(os.getenv('DB_POOL_MAX_AGE', '3600')),
+    # 连接空闲超过该时间（秒）后，取出时先 ping 检查是否可用，0 表示每次取出都检查
+    'ping_interval': float(os.getenv('DB_POOL_PING_INTERVAL', '5')),
+    # 连接池已满时等待空闲连接的最长时间（秒）
+    'timeout': float(os.getenv('DB_POOL_TIMEOUT', '10'))
+}
@@ -1,8 +1,53 @@
 import os
 
+def parse_operation_timeouts(value, defaults):
+    """
+    解析各操作的读取超时配置，格式为 "操作名=秒,操作名=秒"
+    :param value: 配置字符串
+    :param defaults: 默认配置
+    :return: dict
+    """
+    timeouts = dict(defaults)
+    for item in (value or '').split(','):
+        name, _, seconds = item.partition('=')
+        if name.strip() and seconds.strip():
+            timeouts[name.strip()] = float(seconds)
+    return timeouts
+
 # Emby 配置
 emby_config = {
     'url': os.getenv('EMBY_URL', 'http://localhost:8096'),
     'api_key': os.getenv('EMBY_API_KEY', ''),
-    'template_user_id': os.getenv('EMBY_TEMPLATE_USER_ID', '')
+    'template_user_id': os.getenv('EMBY_TEMPLATE_USER_ID', ''),
+    # HTTP 客户端配置（连接超时 / 读取超时，单位秒）
+    'connect_timeout': float(os.getenv('EMBY_CONNECT_TIMEOUT', '5')),
+    'timeout': float(os.getenv('EMBY_TIMEOUT', '10')),
+    # 各操作的读取超时（秒），未列出的操作使用 EMBY_TIMEOUT
+    # 操作名：system_info、list_users、get_user、create_user、set_password、update_policy、delete_user
+    'operation_timeouts': parse_operation_timeouts(os.getenv('EMBY_OPERATION_TIMEOUTS'), {
+        'system_info': 5,
+        'list_users': 30
+    }),
+    # 重试配置：最多尝试次数（包括第一次），指数退避的初始和最大等待时间（秒），需要重试的状态码
+    # 只重试幂等请求（GET/DELETE 及设置绝对值的策略、密码更新），创建用户不重试
+    'retry_max_attempts': int(os.getenv('EMBY_RETRY_MAX_ATTEMPTS', '3')),
+    'retry_backoff_base': float(os.getenv('EMBY_RETRY_BACKOFF_BASE', '0.2')),
+    'retry_backoff_max': float(os.getenv('EMBY_RETRY_BACKOFF_MAX', '2')),
+    'retry_statuses': [int(code) for code in os.getenv('EMBY_RETRY_STATUSES', '500,502,503,504').split(',') if code.strip()],
+    # 由多个 Emby 请求组成的操作（创建用户、启用/禁用用户）的总时间预算（秒），包括所有重试
+    'operation_deadline': float(os.getenv('EMBY_OPERATION_DEADLINE', '30')),
+    # 连接池配置：pool_connections 为缓存的主机连接池数量，pool_maxsize 为单个主机的最大连接数
+    'pool_connections': int(os.getenv('EMBY_POOL_CONNECTIONS', '4')),
+    'pool_maxsize': int(os.getenv('EMBY_POOL_MAXSIZE', '16')),
+    # 熔断配置：连续失败多少次后熔断，熔断多少秒后放行一次试探请求
+    'breaker_failure_threshold': int(os.getenv('EMBY_BREAKER_FAILURE_THRESHOLD', '5')),
+    'breaker_reset_timeout': float(os.getenv('EMBY_BREAKER_RESET_TIMEOUT', '30')),
+    # 后台健康检查间隔（秒）
+    'health_interval': float(os.getenv('EMBY_HEALTH_INTERVAL', '15')),
+    # 读请求缓存配置：最大条目数，以及各接口的缓存有效期（秒，0 表示不缓存）
+    'cache_maxsize': int(os.getenv('EMBY_CACHE_MAXSIZE', '1024')),
+    'cache_ttl': {
+        'system_info': float(os.getenv('EMBY_CACHE_TTL_SYSTEM_INFO', '10')),
+        'user': float(os.getenv('EMBY_CACHE_TTL_USER', '30'))
+    }
 }
@@ -0,0 +1,36 @@
+import os
+
+# 用户管理配置
+user_config = {
+    # 同步用户时并发获取 Emby 用户详情的线程数，建议不超过 EMBY_POOL_MAXSIZE
+    'sync_concurrency': int(os.getenv('SYNC_CONCURRENCY', '8')),
+    # 同步用户时每批写入数据库的记录数，每批提交一次事务
+    'sync_batch_size': int(os.getenv('SYNC_BATCH_SIZE', '500')),
+    # 批量操作用户时并发请求 Emby 的线程数，以及单次请求允许的最大用户数
+    'bulk_concurrency': int(os.getenv('BULK_CONCURRENCY', '8')),
+    'bulk_max_users': int(os.getenv('BULK_MAX_USERS', '1000')),
+    # 检查过期时并发禁用用户的线程数
+    'expire_concurrency': int(os.getenv('EXPIRE_CONCURRENCY', '8')),
+    # 过期调度器：是否启用、从数据库加载即将到期用户的间隔（秒）、检查用户数据版本号的间隔（秒，其他 worker 的修改最迟在该间隔后生效）、非主节点重新选举的间隔（秒）
+    'expire_scheduler_enabled': os.getenv('EXPIRE_SCHEDULER_ENABLED', 'true').lower() == 'true',
+    'expire_refresh_interval': float(os.getenv('EXPIRE_REFRESH_INTERVAL', '60')),
+    'expire_version_interval': float(os.getenv('EXPIRE_VERSION_INTERVAL', '1')),
+    'expire_election_interval': float(os.getenv('EXPIRE_ELECTION_INTERVAL', '30')),
+    # 用户列表 total=cached 时总数的缓存时间（秒），游标分页默认使用缓存的总数
+    'list_count_ttl': float(os.getenv('LIST_COUNT_TTL', '10')),
+    # 内存用户目录：是否启用、检查数据版本号的最小间隔（秒，其他 worker 的修改最迟在该间隔后可见）、强制重新加载的间隔（秒）
+    'directory_enabled': os.getenv('USER_DIRECTORY_ENABLED', 'true').lower() == 'true',
+    'directory_version_interval': float(os.getenv('USER_DIRECTORY_VERSION_INTERVAL', '1')),
+    'directory_max_age': float(os.getenv('USER_DIRECTORY_MAX_AGE', '300')),
+    # 用户列表响应缓存：最大条目数、缓存时间（秒），按过期状态筛选的列表会随时间变化，使用更短的缓存时间
+    'list_cache_maxsize': int(os.getenv('LIST_CACHE_MAXSIZE', '256')),
+    'list_cache_ttl': float(os.getenv('LIST_CACHE_TTL', '60')),
+    'list_cache_expire_ttl': float(os.getenv('LIST_CACHE_EXPIRE_TTL', '5')),
+    # 导出用户时每次从服务端游标读取的行数，以及客户端读取缓慢时 MySQL 等待发送的最长时间（秒）
+    'export_batch_size': int(os.getenv('EXPORT_BATCH_SIZE', '1000')),
+    'export_net_write_timeout': int(os.getenv('EXPORT_NET_WRITE_TIMEOUT', '600')),
+    # 导入用户时并发创建 Emby 用户的线程数、单次最多导入的用户数、每批写入数据库的记录数（中断时最多丢失一批，重新导入会接管）
+    'import_concurrency': int(os.getenv('IMPORT_CONCURRENCY', '8')),
+    'import_max_users': int(os.getenv('IMPORT_MAX_USERS', '5000')),
+    'import_batch_size': int(os.getenv('IMPORT_BATCH_SIZE', '100'))
+}
@@ -0,0 +1,30 @@
+# gunicorn 配置文件，gunicorn 启动时会自动加载当前目录下的 gunicorn.conf.py
+import os
+
+def load_env_file():
+    """
+    加载 .env 文件中的环境变量（与 app.py 相同），主进程执行迁移时还没有导入 app
+    """
+    env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+    if os.path.exists(env_path):
+        with open(env_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    key, value = line.split('=', 1)
+                    os.environ[key] = value
+
+def on_starting(server):
+    """
+    在主进程 fork worker 之前执行一次数据库迁移，worker 通过环境变量得知迁移已完成，不再重复执行
+    迁移失败时不设置该变量，由 worker 在启动时重试
+    """
+    load_env_file()
+
+    from utils.migrations import run_migrations
+    success, message = run_migrations()
+    if success:
+        os.environ['DB_MIGRATIONS_APPLIED'] = 'true'
+        server.log.info(f'数据库迁移完成: {message}')
+    else:
+        server.log.error(f'数据库迁移失败，将由 worker 重试: {message}')
@@ -1,28 +1,125 @@
-import requests
+import os
+import copy
 import json
+import time
+import datetime
+import threading
 from config.emby import emby_config
+from utils.cache import TTLCache
+from utils.emby_client import get_emby_client, with_emby_deadline
 from utils.logger import logger
 
+# Emby 读请求缓存，相同的并发请求只会实际发送一次
+_response_cache = TTLCache(emby_config['cache_maxsize'])
+
+def _user_cache_key(emby_id):
+    return ('user', emby_id)
+
+class EmbyHealthMonitor:
+    def __init__(self, interval=15):
+        """
+        Emby 健康检查：后台线程定期请求 System/Info，保存最近一次的连接状态和延迟
+        :param interval: 检查间隔（秒）
+        """
+        self.interval = interval
+        self._state = None
+        self._thread = None
+        self._thread_pid = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """
+        启动后台检查线程，每个进程只会启动一次
+        """
+        with self._lock:
+            pid = os.getpid()
+            if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name='emby-health-monitor', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+        logger.info(f"🩺 Emby 健康检查已启动，间隔 {self.interval} 秒")
+    
+    def stop(self):
+        self._stop_event.set()
+    
+    def probe(self):
+        """
+        执行一次健康检查并更新状态
+        :return: dict 连接状态
+        """
+        started = time.monotonic()
+        result = _fetch_emby_connection()
+        result['latency_ms'] = round((time.monotonic() - started) * 1000, 1)
+        result['checked_at'] = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self._state = result
+        return result
+    
+    def snapshot(self):
+        """
+        获取最近一次的检查结果
+        :return: dict 或 None（尚未完成检查）
+        """
+        state = self._state
+        if state is None:
+            return None
+        
+        result = copy.deepcopy(state)
+        breaker = get_emby_client().breaker
+        if breaker is not None:
+            result['circuit'] = breaker.snapshot()
+            # 检查之后请求连续失败触发熔断时，以熔断状态为准
+            if result['circuit']['state'] == breaker.OPEN and result['connected']:
+                result['connected'] = False
+                result['message'] = 'Emby服务器暂不可用（已熔断）'
+        return result
+    
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.probe()
+            except Exception as e:
+                logger.error(f"❌ Emby 健康检查出错: {e}")
+            self._stop_event.wait(self.interval)
+
+_health_monitor = EmbyHealthMonitor(emby_config['health_interval'])
+
+def start_emby_health_monitor():
+    """
+    启动 Emby 后台健康检查
+    """
+    _health_monitor.start()
+
 def check_emby_connection():
     """
-    检查Emby连接状态
+    检查Emby连接状态，直接返回后台健康检查的最近结果
+    健康检查尚未完成时才实时请求，连接成功的结果会缓存一段时间
     :return: dict 包含连接状态和服务器信息
     """
-    url = f"{emby_config['url']}/emby/System/Info"
-    headers = {
-        'X-Emby-Token': emby_config['api_key'],
-        'Accept': 'application/json'
-    }
+    _health_monitor.start()
+    result = _health_monitor.snapshot()
+    if result is not None:
+        return result
     
+    result = _response_cache.get_or_load(
+        ('system_info',),
+        _fetch_emby_connection,
+        emby_config['cache_ttl']['system_info'],
+        cacheable=lambda r: r['connected']
+    )
+    return copy.deepcopy(result)
+
+def _fetch_emby_connection():
+    """
+    请求Emby服务器信息
+    :return: dict 包含连接状态和服务器信息
+    """
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = get_emby_client().get('/emby/System/Info', operation='system_info')
         logger.info(f"📡 检查连接状态码: {response.status_code}")
-        try:
-            content_str = response.content.decode('utf-8')
-            content_json = json.loads(content_str)
-            logger.debug(f"📄 检查连接响应内容: {json.dumps(content_json, ensure_ascii=False, indent=2)}")
-        except:
-            logger.debug(f"📄 检查连接响应内容: {response.content}")
+        logger.payload("📄 检查连接响应内容", response.content)
         
         if response.status_code == 200:
             system_info = response.json()
@@ -53,26 +150,35 @@ def check_emby_connection():
             'message': error_msg
         }
 
-def get_emby_user_info(emby_id):
+def get_emby_user_info(emby_id, use_cache=True):
     """
     获取Emby用户信息
     :param emby_id: Emby用户ID
+    :param use_cache: 是否允许使用缓存，为False时总是请求Emby并刷新缓存
+    :return: (success, user_data or error_message)
+    """
+    key = _user_cache_key(emby_id)
+    ttl = emby_config['cache_ttl']['user']
+    if use_cache:
+        success, result = _response_cache.get_or_load(key, lambda: _fetch_emby_user_info(emby_id), ttl, cacheable=lambda r: r[0])
+    else:
+        success, result = _fetch_emby_user_info(emby_id)
+        if success:
+            _response_cache.set(key, result, ttl)
+    
+    # 缓存中的数据是共享的，返回副本避免调用方修改缓存
+    return success, copy.deepcopy(result) if success else result
+
+def _fetch_emby_user_info(emby_id):
+    """
+    请求Emby用户信息
+    :param emby_id: Emby用户ID
     :return: (success, user_data or error_message)
     """
     try:
-        url = f"{emby_config['url']}/emby/Users/{emby_id}"
-        headers = {
-            'X-Emby-Token': emby_config['api_key'],
-            'Accept': 'application/json'
-        }
-        response = requests.get(url, headers=headers, timeout=10)
+        response = get_emby_client().get(f'/emby/Users/{emby_id}', operation='get_user')
         logger.info(f"📡 获取用户信息状态码: {response.status_code}")
-        try:
-            content_str = response.content.decode('utf-8')
-            content_json = json.loads(content_str)
-            logger.debug(f"📄 获取用户信息响应内容: {json.dumps(content_json, ensure_ascii=False, indent=2)}")
-        except:
-            logger.debug(f"📄 获取用户信息响应内容: {response.content}")
+        logger.payload("📄 获取用户信息响应内容", response.content)
         
         if response.status_code == 200:
             user_data = response.json()
@@ -91,21 +197,10 @@ def get_emby_users():
     获取Emby用户列表
     :return: (success, users_list or error_message)
     """
-    url = f"{emby_config['url']}/emby/Users"
-    headers = {
-        'X-Emby-Token': emby_config['api_key'],
-        'Accept': 'application/json'
-    }
-    
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = get_emby_client().get('/emby/Users', operation='list_users')
         logger.info(f"📡 获取用户列表状态码: {response.status_code}")
-        try:
-            content_str = response.content.decode('utf-8')
-            content_json = json.loads(content_str)
-            logger.debug(f"📄 获取用户列表响应内容: {json.dumps(content_json, ensure_ascii=False, indent=2)}")
-        except:
-            logger.debug(f"📄 获取用户列表响应内容: {response.content}")
+        logger.payload("📄 获取用户列表响应内容", response.content)
         
         if response.status_code == 200:
             try:
@@ -137,18 +232,96 @@ def get_emby_user_details(user_id):
     :param user_id: Emby用户ID
     :return: dict 用户详细信息
     """
-    success, result = get_emby_user_info(user_id)
+    # 同步时需要最新数据，不使用缓存
+    success, result = get_emby_user_info(user_id, use_cache=False)
     if success:
         user_details = result
-        logger.info(f"📦 获取用户详细信息: {user_details.get('Name')}")
+        logger.debug(f"📦 获取用户详细信息: {user_details.get('Name')}")
         return user_details
     else:
         logger.error(f"❌ 获取用户详细信息失败: {result}")
         return None
 
+def dump_emby_policy(policy):
+    """
+    序列化Emby用户策略，用于保存到数据库
+    :param policy: 策略dict
+    :return: JSON字符串或None
+    """
+    if not policy:
+        return None
+    return json.dumps(policy, ensure_ascii=False, sort_keys=True)
+
+def load_emby_policy(policy_json):
+    """
+    反序列化数据库中保存的Emby用户策略
+    :param policy_json: JSON字符串
+    :return: 策略dict或None
+    """
+    if not policy_json:
+        return None
+    try:
+        policy = json.loads(policy_json)
+    except ValueError:
+        return None
+    return policy if isinstance(policy, dict) else None
+
+def _read_emby_policy(emby_id, use_cache=False):
+    """
+    从Emby读取用户的策略
+    :param emby_id: Emby用户ID
+    :param use_cache: 是否允许使用缓存中的策略
+    :return: (success, policy or error_message)
+    """
+    success, result = get_emby_user_info(emby_id, use_cache=use_cache)
+    if not success:
+        return False, result
+    policy = result.get('Policy')
+    if not policy:
+        return False, '获取用户策略信息失败'
+    return True, policy
+
+@with_emby_deadline(emby_config['operation_deadline'])
+def set_emby_user_active(emby_id, is_active, policy_json=None):
+    """
+    启用/禁用Emby用户
+    优先使用本地保存的策略，只需一次Emby请求；本地没有策略时使用缓存的策略（连续启用/禁用同一用户不必每次读取），
+    Emby拒绝了本地或缓存的策略时，读取最新策略后再提交
+    读取、更新和重试共用 EMBY_OPERATION_DEADLINE 的时间预算
+    :param emby_id: Emby用户ID
+    :param is_active: 是否启用
+    :param policy_json: 本地保存的策略JSON
+    :return: (success, 更新后的策略JSON or error_message)
+    """
+    policy = load_emby_policy(policy_json)
+    from_mirror = policy is not None
+    if not from_mirror:
+        success, policy = _read_emby_policy(emby_id, use_cache=True)
+        if not success:
+            return False, policy
+    
+    # 只修改IsDisabled字段
+    policy['IsDisabled'] = not is_active
+    success, error_msg = update_emby_user_policy(emby_id, policy)
+    
+    if not success:
+        # 本地或缓存的策略可能已过期，重新读取后重试一次
+        logger.warning(f"⚠️  使用{'本地' if from_mirror else '缓存的'}策略更新 Emby 用户 {emby_id} 失败，重新读取策略后重试")
+        read_success, policy = _read_emby_policy(emby_id)
+        if not read_success:
+            return False, policy
+        policy['IsDisabled'] = not is_active
+        success, error_msg = update_emby_user_policy(emby_id, policy)
+    
+    if not success:
+        return False, error_msg
+    return True, dump_emby_policy(policy)
+
+@with_emby_deadline(emby_config['operation_deadline'])
 def create_emby_user(user_data):
     """
-    创建Emby用户
+    创建Emby用户，创建和设置密码共用 EMBY_OPERATION_DEADLINE 的时间预算
+    创建请求不是幂等的，只在连接超时（请求未发出）时重试
     :param user_data: 用户数据
     :return: (success, user_info or error_message)
     """
@@ -159,10 +332,6 @@ def create_emby_user(user_data):
     template_user_id = emby_config.get('template_user_id', '')
     logger.info(f"🔑 配置的模板用户 ID: {template_user_id}")
     
-    # 获取用户密码
-    user_password = user_data.get('Password', '123456')
-    logger.info(f"🔐 获取到的用户密码: {user_password}")
-    
     # 必须配置模板用户 ID
     if not template_user_id:
         error_msg = "未配置模板用户 ID，请在 .env 文件中设置 EMBY_TEMPLATE_USER_ID"
@@ -171,12 +340,8 @@ def create_emby_user(user_data):
     
     # 使用正确的Emby API端点创建用户
     # 根据官方文档，应该使用 /Users/New 端点并设置 CopyFromUserId 参数
-    url = f"{emby_config['url']}/emby/Users/New"
-    headers = {
-        'X-Emby-Token': emby_config['api_key'],
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
+    client = get_emby_client()
+    url = client.url('/emby/Users/New')
     
     # 构建请求数据 - 使用官方文档指定的参数格式
     # 优先使用小写字段名（前端传入的），然后使用大写字段名
@@ -191,17 +356,11 @@ def create_emby_user(user_data):
     
     logger.info(f"✨ 从模板创建用户: {user_name}，使用模板 ID {template_user_id}")
     logger.info(f"🔗 请求 URL: {url}")
-    logger.debug(f"📋 请求消息体: {json.dumps(template_data, ensure_ascii=False, indent=2)}")
-    # logger.debug(f"📝 请求头: {json.dumps(headers, ensure_ascii=False, indent=2)}")
+    logger.payload("📋 请求消息体", template_data)
     
-    response = requests.post(url, json=template_data, headers=headers)
+    response = client.post('/emby/Users/New', json=template_data, operation='create_user')
     logger.info(f"📡 从模板创建状态码: {response.status_code}")
-    try:
-        content_str = response.content.decode('utf-8')
-        content_json = json.loads(content_str)
-        # logger.debug(f"📄 从模板创建响应内容: {json.dumps(content_json, ensure_ascii=False, indent=2)}")
-    except:
-        logger.debug(f"📄 从模板创建响应内容: {response.content}")
+    # logger.payload("📄 从模板创建响应内容", response.content)
     # logger.debug(f"📝 响应头: {json.dumps(dict(response.headers), ensure_ascii=False, indent=2)}")
     
     # 必须使用模板创建成功才算成功
@@ -230,35 +389,16 @@ def create_emby_user(user_data):
             user_id = response_json.get('Id')
             if user_id:
                 logger.info(f"✅ 用户创建成功，用户ID: {user_id}")
+                _response_cache.invalidate(_user_cache_key(user_id))
                 
                 # 从前端传入的值获取密码，同时处理大小写
                 # 优先使用大写的Password键，因为在create_user函数中传递的是大写的Password
                 user_password = user_data.get('Password', '123456')
-                logger.info(f"🔐 初始化用户密码为: {user_password}")
-                logger.debug(f"📋 前端传入的完整数据: {json.dumps(user_data, ensure_ascii=False, indent=2)}")
-                password_url = f"{emby_config['url']}/emby/Users/{user_id}/Password"
-                password_data = {
-                    # 'CurrentPw': None,
-                    'NewPw': user_password
-                    # 'ResetPassword': True
-                }
-                
-                logger.info(f"🔗 密码设置 URL: {password_url}")
-                logger.debug(f"📋 密码设置数据: {json.dumps(password_data, ensure_ascii=False, indent=2)}")
-                
-                password_response = requests.post(password_url, json=password_data, headers=headers)
-                logger.info(f"📡 密码设置状态码: {password_response.status_code}")
-                try:
-                    content_str = password_response.content.decode('utf-8')
-                    content_json = json.loads(content_str)
-                    logger.debug(f"📄 密码设置响应内容: {json.dumps(content_json, ensure_ascii=False, indent=2)}")
-                except:
-                    logger.debug(f"📄 密码设置响应内容: {password_response.content}")
-                
-                # 密码设置成功
-                if password_response.status_code in [200, 204]:
-                    logger.info(f"✅ 密码设置成功")
-                else:
+                # 日志中不输出密码
+                logger.info(f"🔐 初始化用户密码")
+                logger.payload("📋 前端传入的完整数据", {key: value for key, value in user_data.items() if key != 'Password'})
+                success, _ = set_emby_user_password(user_id, user_password)
+                if not success:
                     logger.warning(f"⚠️  密码设置失败，但用户已创建成功")
             
             return True, response_json
@@ -267,6 +407,39 @@ def create_emby_user(user_data):
         logger.error(f"❌ {error_msg}")
         return False, {'error': error_msg}
 
+def set_emby_user_password(user_id, password):
+    """
+    设置Emby用户密码
+    :param user_id: Emby用户ID
+    :param password: 新密码
+    :return: (success, error_message or None)
+    """
+    client = get_emby_client()
+    password_path = f'/emby/Users/{user_id}/Password'
+    password_data = {
+        # 'CurrentPw': None,
+        'NewPw': password
+        # 'ResetPassword': True
+    }
+    
+    logger.info(f"🔗 密码设置 URL: {client.url(password_path)}")
+    
+    try:
+        password_response = client.post(password_path, json=password_data, operation='set_password', idempotent=True)
+        logger.info(f"📡 密码设置状态码: {password_response.status_code}")
+        logger.payload("📄 密码设置响应内容", password_response.content)
+        
+        if password_response.status_code in [200, 204]:
+            logger.info(f"✅ 密码设置成功")
+            return True, None
+        error_msg = f"密码设置失败，状态码: {password_response.status_code}，响应: {password_response.content}"
+        logger.error(f"❌ Emby 用户 {user_id} {error_msg}")
+        return False, error_msg
+    except Exception as e:
+        error_msg = f"密码设置错误: {str(e)}"
+        logger.error(f"❌ Emby 用户 {user_id} {error_msg}")
+        return False, error_msg
+
 def update_emby_user_policy(user_id, user_data):
     """
     更新Emby用户策略
@@ -274,35 +447,37 @@ def update_emby_user_policy(user_id, user_data):
     :param user_data: 用户策略数据
     :return: (success, error_message or None)
     """
-    url = f"{emby_config['url']}/emby/Users/{user_id}/Policy"
-    headers = {
-        'X-Emby-Token': emby_config['api_key'],
-        'Content-Type': 'application/json',
-        'Accept': 'application/json'
-    }
+    client = get_emby_client()
+    path = f'/emby/Users/{user_id}/Policy'
+    url = client.url(path)
     
     logger.info(f"🔄 更新 Emby 用户: {user_id}")
     logger.info(f"🔗 请求 URL: {url}")
-    logger.debug(f"📋 请求数据: {json.dumps(user_data, ensure_ascii=False, indent=2)}")
+    logger.payload("📋 请求数据", user_data)
     
+    key = _user_cache_key(user_id)
+    hit, cached = _response_cache.get(key)
     try:
-        response = requests.post(url, json=user_data, headers=headers, timeout=10)
+        response = client.post(path, json=user_data, operation='update_policy', idempotent=True)
+        # 无论更新是否成功，缓存中的策略都可能已过期
+        _response_cache.invalidate(key)
         logger.info(f"📡 更新状态码: {response.status_code}")
-        try:
-            content_str = response.content.decode('utf-8')
-            content_json = json.loads(content_str)
-            logger.debug(f"📄 更新响应内容: {json.dumps(content_json, ensure_ascii=False, indent=2)}")
-        except:
-            logger.debug(f"📄 更新响应内容: {response.content}")
+        logger.payload("📄 更新响应内容", response.content)
         
         if response.status_code in [200, 204]:
             logger.info(f"✅ Emby 用户 {user_id} 更新成功")
+            if hit and cached[0]:
+                # 更新成功时把新策略写回缓存，连续启用/禁用同一用户不必重新读取
+                user_info = copy.deepcopy(cached[1])
+                user_info['Policy'] = copy.deepcopy(user_data)
+                _response_cache.set(key, (True, user_info), emby_config['cache_ttl']['user'])
             return True, None
         else:
             error_msg = f"更新失败，状态码: {response.status_code}，响应: {response.content}"
             logger.error(f"❌ Emby 用户 {user_id} {error_msg}")
             return False, error_msg
     except Exception as e:
+        _response_cache.invalidate(key)
         error_msg = f"更新错误: {str(e)}"
         logger.error(f"❌ Emby 用户 {user_id} {error_msg}")
         return False, error_msg
@@ -313,21 +488,11 @@ def delete_emby_user(user_id):
     :param user_id: Emby用户ID
     :return: (success, error_message or None)
     """
-    url = f"{emby_config['url']}/emby/Users/{user_id}"
-    headers = {
-        'X-Emby-Token': emby_config['api_key'],
-        'Accept': 'application/json'
-    }
-    
     try:
-        response = requests.delete(url, headers=headers, timeout=10)
+        response = get_emby_client().delete(f'/emby/Users/{user_id}', operation='delete_user')
+        _response_cache.invalidate(_user_cache_key(user_id))
         logger.info(f"📡 删除用户状态码: {response.status_code}")
-        try:
-            content_str = response.content.decode('utf-8')
-            content_json = json.loads(content_str)
-            logger.debug(f"📄 删除响应内容: {json.dumps(content_json, ensure_ascii=False, indent=2)}")
-        except:
-            logger.debug(f"📄 删除响应内容: {response.content}")
+        logger.payload("📄 删除响应内容", response.content)
         
         if response.status_code == 204:
             logger.info(f"✅ Emby 用户 {user_id} 删除成功")
@@ -337,6 +502,7 @@ def delete_emby_user(user_id):
             logger.error(f"❌ Emby 用户 {user_id} {error_msg}")
             return False, error_msg
     except Exception as e:
+        _response_cache.invalidate(_user_cache_key(user_id))
         error_msg = f"删除错误: {str(e)}"
         logger.error(f"❌ Emby 用户 {user_id} {error_msg}")
         return False, error_msg
@@ -0,0 +1,270 @@
+import os
+import heapq
+import time
+import datetime
+import threading
+import pymysql
+from config.users import user_config
+from utils.database import get_db_connection, create_db_connection
+from utils.logger import logger
+
+# 用于选举调度器主节点的 MySQL 命名锁
+LEADER_LOCK_NAME = 'emby_manager.expire_scheduler'
+
+class ExpireScheduler:
+    def __init__(self, refresh_interval=60, election_interval=30, concurrency=8, version_interval=1):
+        """
+        过期调度器：用最小堆保存即将到期的用户，在到期时刻禁用用户
+        多个 worker 中只有通过 MySQL GET_LOCK 选举出的主节点会执行调度
+        :param refresh_interval: 从数据库加载即将到期用户的间隔（秒）
+        :param election_interval: 非主节点重新尝试选举的间隔（秒）
+        :param concurrency: 禁用用户时并发请求 Emby 的线程数
+        :param version_interval: 主节点检查用户数据版本号的间隔（秒），版本号变化时立即重新加载，其他 worker 的修改最迟在该间隔后生效
+        """
+        self.refresh_interval = refresh_interval
+        self.version_interval = version_interval
+        self.election_interval = election_interval
+        self.concurrency = concurrency
+        # 堆中元素为 (过期时间, 用户ID)，_deadlines 保存每个用户最新的过期时间，用于丢弃已失效的堆元素
+        self._heap = []
+        self._deadlines = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._lock_conn = None
+        self._thread = None
+        self._thread_pid = None
+        self.is_leader = False
+
+    def start(self):
+        """
+        启动调度线程，每个进程只会启动一次
+        """
+        with self._cond:
+            pid = os.getpid()
+            if self._thread is not None and self._thread_pid == pid and self._thread.is_alive():
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run, name='expire-scheduler', daemon=True)
+            self._thread_pid = pid
+            self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    def schedule(self, user_id, expire_date):
+        """
+        更新用户的过期时间，只在主节点生效
+        其他 worker 上的修改会递增用户数据版本号，主节点检查到版本号变化后重新从数据库加载
+        :param user_id: 用户ID
+        :param expire_date: 过期时间（datetime 或 MySQL DATETIME 格式字符串），为空表示永久有效
+        """
+        if not self.is_leader:
+            return
+        if isinstance(expire_date, str):
+            try:
+                expire_date = datetime.datetime.strptime(expire_date, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                return
+
+        with self._cond:
+            self._push(user_id, expire_date)
+            self._cond.notify()
+
+    def _push(self, user_id, expire_date):
+        if expire_date is None:
+            self._deadlines.pop(user_id, None)
+            return
+        if self._deadlines.get(user_id) == expire_date:
+            return
+        self._deadlines[user_id] = expire_date
+        heapq.heappush(self._heap, (expire_date, user_id))
+
+    def _pop_due(self):
+        """
+        取出所有已到期的用户
+        :return: 用户ID列表
+        """
+        now = datetime.datetime.now()
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                expire_date, user_id = heapq.heappop(self._heap)
+                # 过期时间已被修改的旧元素直接丢弃
+                if self._deadlines.get(user_id) != expire_date:
+                    continue
+                del self._deadlines[user_id]
+                due.append(user_id)
+        return due
+
+    def _run(self):
+        while not self._stopped:
+            if not self._acquire_leadership():
+                self._wait(self.election_interval)
+                continue
+
+            logger.info(f"👑 当前进程 (PID: {os.getpid()}) 成为过期调度主节点")
+            try:
+                self._lead()
+            except Exception as e:
+                logger.error(f"❌ 过期调度出错: {e}")
+            finally:
+                self._release_leadership()
+            self._wait(self.election_interval)
+
+    def _lead(self):
+        next_refresh = 0
+        next_version_check = 0
+        version = None
+        while not self._stopped:
+            if time.monotonic() >= next_refresh:
+                if not self._still_leader():
+                    logger.warning("⚠️  过期调度主节点锁已丢失，重新选举")
+                    return
+                # 先读版本号再加载，加载期间的修改会在下次检查时发现
+                version = self._read_version()
+                self._load_upcoming()
+                next_refresh = time.monotonic() + self.refresh_interval
+                next_version_check = time.monotonic() + self.version_interval
+            elif time.monotonic() >= next_version_check:
+                # 其他 worker 修改了用户（如修改过期时间）时立即重新加载，不必等到下个刷新周期
+                current_version = self._read_version()
+                if current_version != version:
+                    version = current_version
+                    self._load_upcoming()
+                next_version_check = time.monotonic() + self.version_interval
+
+            due = self._pop_due()
+            if due:
+                self._expire_users(due)
+                continue
+
+            with self._cond:
+                timeout = min(next_refresh, next_version_check) - time.monotonic()
+                if self._heap:
+                    timeout = min(timeout, (self._heap[0][0] - datetime.datetime.now()).total_seconds())
+                if timeout > 0 and not self._stopped:
+                    self._cond.wait(timeout)
+
+    def _read_version(self):
+        """
+        通过主节点锁的连接读取用户数据版本号（自动提交，每次都能读到最新值）
+        :return: int
+        """
+        with self._lock_conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM data_versions WHERE name = 'users'")
+            row = cursor.fetchone()
+        return row[0] if row else 0
+
+    def _load_upcoming(self):
+        """
+        加载已过期或将在下个刷新周期内过期的用户，只扫描 expire_date 索引范围内的记录
+        """
+        horizon = int(self.refresh_interval * 2)
+        with self._lock_conn.cursor() as cursor:
+            cursor.execute('''
+                SELECT id, expire_date FROM users
+                WHERE state = 1 AND is_active = TRUE AND expire_date < NOW() + INTERVAL %s SECOND
+            ''', (horizon,))
+            rows = cursor.fetchall()
+
+        with self._cond:
+            for user_id, expire_date in rows:
+                self._push(user_id, expire_date)
+        logger.debug(f"⏰ 已加载 {len(rows)} 个即将过期的用户，堆大小 {len(self._heap)}")
+
+    def _expire_users(self, user_ids):
+        """
+        禁用到期用户，禁用前重新确认数据库中的过期时间，避免使用已失效的调度
+        :param user_ids: 用户ID列表
+        """
+        from services.user_service import disable_users
+
+        try:
+            conn = get_db_connection()
+            cursor = conn.cursor(pymysql.cursors.DictCursor)
+            placeholders = ', '.join(['%s'] * len(user_ids))
+            cursor.execute(f'''
+                SELECT id, emby_id, name, emby_policy FROM users
+                WHERE id IN ({placeholders}) AND state = 1 AND is_active = TRUE AND expire_date <= NOW()
+            ''', user_ids)
+            users = cursor.fetchall()
+            cursor.close()
+
+            if users:
+                disabled_ids = disable_users(conn, users, self.concurrency)
+                logger.info(f"⏰ 调度禁用到期用户 {len(disabled_ids)}/{len(users)} 个")
+            conn.close()
+        except Exception as e:
+            logger.error(f"❌ 调度禁用到期用户出错: {e}")
+
+    def _acquire_leadership(self):
+        """
+        尝试获取主节点锁，锁随专用连接保持，连接断开时自动释放
+        :return: bool
+        """
+        try:
+            conn = create_db_connection(autocommit=True)
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT GET_LOCK(%s, 0)', (LEADER_LOCK_NAME,))
+                acquired = cursor.fetchone()[0] == 1
+            if not acquired:
+                conn.close()
+                return False
+        except Exception as e:
+            logger.debug(f"过期调度选举失败: {e}")
+            return False
+
+        self._lock_conn = conn
+        self.is_leader = True
+        return True
+
+    def _still_leader(self):
+        try:
+            with self._lock_conn.cursor() as cursor:
+                cursor.execute('SELECT IS_USED_LOCK(%s) = CONNECTION_ID()', (LEADER_LOCK_NAME,))
+                return cursor.fetchone()[0] == 1
+        except Exception:
+            return False
+
+    def _release_leadership(self):
+        self.is_leader = False
+        with self._cond:
+            self._heap.clear()
+            self._deadlines.clear()
+        if self._lock_conn is not None:
+            try:
+                with self._lock_conn.cursor() as cursor:
+                    cursor.execute('SELECT RELEASE_LOCK(%s)', (LEADER_LOCK_NAME,))
+                self._lock_conn.close()
+            except Exception:
+                pass
+            self._lock_conn = None
+
+    def _wait(self, seconds):
+        with self._cond:
+            if not self._stopped:
+                self._cond.wait(seconds)
+
+_scheduler = ExpireScheduler(
+    refresh_interval=user_config['expire_refresh_interval'],
+    election_interval=user_config['expire_election_interval'],
+    concurrency=user_config['expire_concurrency'],
+    version_interval=user_config['expire_version_interval']
+)
+
+def start_expire_scheduler():
+    """
+    启动过期调度器（EXPIRE_SCHEDULER_ENABLED=false 时不启动）
+    """
+    if user_config['expire_scheduler_enabled']:
+        _scheduler.start()
+
+def schedule_user_expire(user_id, expire_date):
+    """
+    通知调度器用户的过期时间已变化
+    :param user_id: 用户ID
+    :param expire_date: 新的过期时间，为空表示永久有效
+    """
+    _scheduler.schedule(user_id, expire_date)
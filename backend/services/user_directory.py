@@ -0,0 +1,193 @@
+import time
+import datetime
+import threading
+from utils.logger import logger
+
+# 名称索引的最大 n-gram 长度：长度不超过该值的查询直接命中索引，更长的查询取各个 n-gram 的交集后再校验
+MAX_GRAM = 3
+
+def name_grams(name):
+    """
+    生成名称的所有 1~3 字符子串，中文名称通常只有两三个字，也能按单字检索
+    :param name: 已转为小写的名称
+    :return: set
+    """
+    grams = set()
+    for n in range(1, MAX_GRAM + 1):
+        for i in range(len(name) - n + 1):
+            grams.add(name[i:i + n])
+    return grams
+
+class _Snapshot:
+    """
+    某个数据版本下的用户目录，加载后不再修改，读取时无需加锁
+    """
+    def __init__(self, version, rows, load_ms):
+        self.version = version
+        self.load_ms = load_ms
+        self.loaded_at = time.monotonic()
+        self.users = {}
+        self.ids = []
+        self.names = {}
+        self.grams = {}
+
+        for row in rows:
+            user_id = row['id']
+            name = (row.get('name') or '').casefold()
+            self.users[user_id] = row
+            self.names[user_id] = name
+            for gram in name_grams(name):
+                self.grams.setdefault(gram, set()).add(user_id)
+        self.ids = sorted(self.users)
+
+    def match_name(self, query):
+        """
+        按名称子串匹配（不区分大小写，与 MySQL 默认排序规则下的 LIKE '%q%' 一致）
+        :param query: 搜索关键词
+        :return: 按 id 排序的用户ID列表
+        """
+        query = query.casefold()
+        if len(query) <= MAX_GRAM:
+            return sorted(self.grams.get(query, ()))
+
+        # 取各个三字符子串对应集合的交集，从最小的集合开始，再校验完整子串
+        sets = []
+        for i in range(len(query) - MAX_GRAM + 1):
+            ids = self.grams.get(query[i:i + MAX_GRAM])
+            if not ids:
+                return []
+            sets.append(ids)
+        sets.sort(key=len)
+        candidates = set(sets[0])
+        for ids in sets[1:]:
+            candidates &= ids
+            if not candidates:
+                return []
+        return sorted(user_id for user_id in candidates if query in self.names[user_id])
+
+class UserDirectory:
+    def __init__(self, loader, version_loader, version_interval=1.0, max_age=300):
+        """
+        进程内的用户目录：从 MySQL 加载全部有效用户，在内存中完成名称搜索、筛选和分页
+        数据库中的数据版本号变化（任意 worker 修改了用户表）时重新加载，本进程的修改会立即使目录失效
+        :param loader: 加载函数，返回按 id 排序的用户记录列表
+        :param version_loader: 读取数据版本号的函数
+        :param version_interval: 检查数据版本号的最小间隔（秒）
+        :param max_age: 目录最长使用时间（秒），超过后无论版本号是否变化都重新加载
+        """
+        self.loader = loader
+        self.version_loader = version_loader
+        self.version_interval = version_interval
+        self.max_age = max_age
+
+        self._snapshot = None
+        self._stale = True
+        self._checked_at = 0.0
+        self._load_lock = threading.Lock()
+
+        # 统计数据
+        self._loads = 0
+        self._queries = 0
+        self._fallbacks = 0
+
+    def invalidate(self):
+        """
+        标记目录可能已过期，下次查询时检查数据版本号
+        """
+        self._stale = True
+
+    def current_version(self):
+        """
+        获取目录当前的数据版本号，必要时先检查版本号并重新加载
+        :return: int
+        """
+        return self._fresh_snapshot().version
+
+    def search(self, search_query='', status_filter=None, expire_status=None):
+        """
+        查询符合条件的用户
+        :param search_query: 搜索关键词
+        :param status_filter: 状态过滤（'true' / 'false'）
+        :param expire_status: 过期状态过滤（active / expired）
+        :return: 按 id 排序的用户记录列表，目录不可用时返回 None，调用方应回退到 MySQL 查询
+        """
+        try:
+            snapshot = self._fresh_snapshot()
+        except Exception as e:
+            self._fallbacks += 1
+            logger.warning(f"⚠️  用户目录不可用，回退到数据库查询: {e}")
+            return None
+
+        self._queries += 1
+        ids = snapshot.match_name(search_query) if search_query else snapshot.ids
+        users = snapshot.users
+
+        if status_filter is None and expire_status not in ('active', 'expired'):
+            return [users[user_id] for user_id in ids]
+
+        is_active = status_filter.lower() == 'true' if status_filter is not None else None
+        now = datetime.datetime.now()
+        result = []
+        for user_id in ids:
+            user = users[user_id]
+            if is_active is not None and bool(user['is_active']) != is_active:
+                continue
+            expire_date = user['expire_date']
+            if expire_status == 'active' and expire_date is not None and expire_date < now:
+                continue
+            if expire_status == 'expired' and (expire_date is None or expire_date >= now):
+                continue
+            result.append(user)
+        return result
+
+    def stats(self):
+        """
+        获取用户目录统计数据
+        :return: dict
+        """
+        snapshot = self._snapshot
+        return {
+            'loaded': snapshot is not None,
+            'version': snapshot.version if snapshot else None,
+            'users': len(snapshot.ids) if snapshot else 0,
+            'grams': len(snapshot.grams) if snapshot else 0,
+            'load_ms': snapshot.load_ms if snapshot else None,
+            'age_seconds': round(time.monotonic() - snapshot.loaded_at, 1) if snapshot else None,
+            'loads': self._loads,
+            'queries': self._queries,
+            'fallbacks': self._fallbacks
+        }
+
+    def _is_fresh(self, snapshot, now):
+        return (
+            snapshot is not None
+            and not self._stale
+            and now - self._checked_at < self.version_interval
+            and now - snapshot.loaded_at < self.max_age
+        )
+
+    def _fresh_snapshot(self):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot, time.monotonic()):
+            return snapshot
+
+        # 同一时间只有一个线程检查版本号和加载，其余线程等待后直接使用结果
+        with self._load_lock:
+            snapshot = self._snapshot
+            now = time.monotonic()
+            if self._is_fresh(snapshot, now):
+                return snapshot
+
+            # 先清除标记再读取版本号，读取期间发生的修改会重新触发检查
+            self._stale = False
+            version = self.version_loader()
+            if snapshot is None or snapshot.version != version or now - snapshot.loaded_at >= self.max_age:
+                started = time.perf_counter()
+                rows = self.loader()
+                load_ms = round((time.perf_counter() - started) * 1000, 1)
+                snapshot = _Snapshot(version, rows, load_ms)
+                self._snapshot = snapshot
+                self._loads += 1
+                logger.debug(f"📇 用户目录已加载: {len(snapshot.ids)} 个用户，版本 {version}，耗时 {load_ms} 毫秒")
+            self._checked_at = time.monotonic()
+            return snapshot
@@ -1,12 +1,54 @@
+import io
+import csv
+import json
+import math
+import time
+import base64
+import bisect
+import hashlib
 import datetime
 import pymysql
-from utils.database import get_db_connection
+from concurrent.futures import ThreadPoolExecutor
+from config.users import user_config
+from utils.database import get_db_connection, create_db_connection, bulk_insert, bulk_update, escape_like, iter_chunks, bump_data_version, get_data_version
+from utils.cache import TTLCache
 from utils.logger import logger
-from services.emby_service import get_emby_users, get_emby_user_details, create_emby_user, update_emby_user_policy, delete_emby_user
+from utils.json_provider import dumps_bytes
+from utils.emby_client import propagate_deadline
+from services.expire_service import schedule_user_expire
+from services.user_directory import UserDirectory
+from config.emby import emby_config
+from services.emby_service import get_emby_users, get_emby_user_info, get_emby_user_details, create_emby_user, delete_emby_user, set_emby_user_active, set_emby_user_password, dump_emby_policy
+
+def normalize_datetime(value):
+    """
+    将前端传入的ISO时间字符串转换为MySQL DATETIME格式
+    :param value: 时间字符串，如 2026-02-20T01:45:00.000Z 或 2026-02-20 01:45:00
+    :return: MySQL DATETIME格式字符串，无法解析时原样返回
+    """
+    if value and isinstance(value, str):
+        try:
+            dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return dt.strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            pass
+    return value
+
+def commit_user_changes(conn, cursor):
+    """
+    提交用户表的修改：在同一事务中递增数据版本号，提交后使本进程的用户目录立即失效
+    其他 worker 的用户目录通过数据版本号得知变化
+    :param conn: 数据库连接
+    :param cursor: 执行修改的游标
+    """
+    bump_data_version(cursor)
+    conn.commit()
+    user_directory.invalidate()
 
 def toggle_user_status(user_id, is_active):
     """
     启用/禁用用户
+    使用数据库中保存的 Emby 策略，正常情况下只需要一次 Emby 请求
     :param user_id: 用户ID
     :param is_active: 是否启用
     :return: (success, message)
@@ -16,50 +58,30 @@ def toggle_user_status(user_id, is_active):
         cursor = conn.cursor()
         
         # 获取用户信息
-        cursor.execute('SELECT emby_id FROM users WHERE id = %s AND state = 1', (user_id,))
+        cursor.execute('SELECT emby_id, emby_policy FROM users WHERE id = %s AND state = 1', (user_id,))
         user = cursor.fetchone()
         if not user:
             cursor.close()
             conn.close()
             return False, '用户不存在'
         
-        emby_id = user[0]
-        
-        # 先获取用户的完整策略信息
-        from services.emby_service import get_emby_user_info
-        success, result = get_emby_user_info(emby_id)
-        if not success:
-            cursor.close()
-            conn.close()
-            return False, result
-        
-        user_data = result
-        # 获取用户的策略信息
-        user_policy = user_data.get('Policy')
-        if not user_policy:
-            cursor.close()
-            conn.close()
-            return False, '获取用户策略信息失败'
-        
-        # 只修改IsDisabled字段
-        user_policy['IsDisabled'] = not is_active
-        emby_user_data = user_policy
+        emby_id, policy_json = user
         
         # 更新 Emby 用户状态
-        emby_update_success, error_msg = update_emby_user_policy(emby_id, emby_user_data)
+        emby_update_success, result = set_emby_user_active(emby_id, is_active, policy_json)
         status_icon = "🔒" if not is_active else "🔓"
         result_icon = "✅" if emby_update_success else "❌"
         logger.info(f"{result_icon} {status_icon} 已更新 Emby 用户 {emby_id} 状态: {'已禁用' if not is_active else '已启用'}, 成功: {emby_update_success}")
         
         # 只有在Emby更新成功后才更新数据库
         if emby_update_success:
-            # 更新数据库
+            # 更新数据库并保存最新策略，清空同步指纹使下次同步重新比较该用户
             cursor.execute('''
                 UPDATE users 
-                SET is_active = %s, updated_at = CURRENT_TIMESTAMP 
+                SET is_active = %s, emby_policy = %s, fingerprint = NULL, updated_at = CURRENT_TIMESTAMP 
                 WHERE id = %s
-            ''', (is_active, user_id))
-            conn.commit()
+            ''', (is_active, result, user_id))
+            commit_user_changes(conn, cursor)
             
             cursor.close()
             conn.close()
@@ -69,14 +91,120 @@ def toggle_user_status(user_id, is_active):
             # Emby更新失败
             cursor.close()
             conn.close()
-            return False, f'在Emby中更新用户状态失败: {error_msg}' if error_msg else '在Emby中更新用户状态失败'
+            return False, f'在Emby中更新用户状态失败: {result}' if result else '在Emby中更新用户状态失败'
     except Exception as e:
         logger.error(f"❌ 启用/禁用用户错误: {e}")
         return False, str(e)
 
-def sync_users():
+def has_sync_fields(emby_user):
+    """
+    判断 Emby 用户数据是否已包含同步所需的字段（注册时间和禁用状态）
+    :param emby_user: Emby 用户数据
+    :return: bool
+    """
+    return 'DateCreated' in emby_user and 'IsDisabled' in (emby_user.get('Policy') or {})
+
+def iter_emby_user_details(emby_users, full_fetch=False, concurrency=None):
+    """
+    获取同步所需的 Emby 用户详情，按输入顺序逐个返回
+    /emby/Users 列表接口通常已返回注册时间和策略，默认只对缺少字段的用户单独请求详情
+    :param emby_users: Emby 用户列表
+    :param full_fetch: 是否对每个用户都单独请求详情
+    :param concurrency: 并发数，默认使用 SYNC_CONCURRENCY 配置
+    :return: 生成器，逐个返回 (user, user_details, fetched)，fetched 表示是否单独请求了详情，请求失败时 user_details 为 None
+    """
+    need_fetch = [full_fetch or not has_sync_fields(user) for user in emby_users]
+    fetch_ids = [user['Id'] for user, fetch in zip(emby_users, need_fetch) if fetch]
+    if not fetch_ids:
+        for user in emby_users:
+            yield user, user, False
+        return
+    
+    concurrency = max(1, concurrency or user_config['sync_concurrency'])
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, len(fetch_ids)))
+    try:
+        # executor.map 会立即提交所有任务，并按提交顺序返回结果
+        details = executor.map(propagate_deadline(get_emby_user_details), fetch_ids)
+        for user, fetch in zip(emby_users, need_fetch):
+            if fetch:
+                # 单独请求失败时返回 None，由调用方跳过该用户，不能用缺少字段的列表数据覆盖数据库
+                yield user, next(details), True
+            else:
+                yield user, user, False
+    finally:
+        # 调用方提前退出（如数据库写入出错）时取消尚未开始的请求
+        executor.shutdown(cancel_futures=True)
+
+# 同步写入的字段，第一个字段 emby_id 为唯一键
+SYNC_COLUMNS = ['emby_id', 'name', 'is_active', 'state', 'created_at', 'emby_policy', 'fingerprint']
+
+def user_fingerprint(name, is_active, created_at, policy_json=None):
+    """
+    计算用户同步指纹，Emby 中相关字段不变时指纹不变
+    :param name: 用户名
+    :param is_active: 是否启用
+    :param created_at: 注册时间（MySQL datetime 格式字符串或None）
+    :param policy_json: 序列化后的 Emby 策略
+    :return: 40位十六进制字符串
+    """
+    raw = json.dumps([name, bool(is_active), created_at, policy_json], ensure_ascii=False)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+def build_sync_row(user, user_details):
+    """
+    根据 Emby 用户数据构建同步到数据库的记录
+    :param user: Emby 用户列表中的数据
+    :param user_details: Emby 用户详情
+    :return: dict 包含 emby_id、name、is_active、created_at、emby_policy、fingerprint
+    """
+    emby_id = user['Id']
+    name = user['Name']
+    
+    # 逐个用户的日志量较大，使用 DEBUG 级别，每批写入时输出一条汇总
+    logger.debug(f"👤 正在处理用户: {name} (ID: {emby_id})")
+    
+    date_created = None
+    is_active = True
+    policy_json = None
+    
+    if user_details:
+        # 获取注册时间
+        if 'DateCreated' in user_details:
+            date_created = user_details['DateCreated']
+            logger.debug(f"📅 注册时间: {date_created}")
+            # 转换ISO 8601格式为MySQL datetime格式
+            try:
+                # 解析ISO 8601格式
+                dt = datetime.datetime.fromisoformat(date_created.replace('Z', '+00:00'))
+                # 转换为MySQL支持的datetime格式
+                date_created = dt.strftime('%Y-%m-%d %H:%M:%S')
+                logger.debug(f"🔄 转换后注册时间: {date_created}")
+            except Exception as e:
+                logger.warning(f"⚠️  时间格式转换失败: {e}")
+                date_created = None
+        
+        # 获取激活状态，使用 $.Policy.IsDisabled
+        if 'Policy' in user_details and 'IsDisabled' in user_details['Policy']:
+            is_active = not user_details['Policy']['IsDisabled']
+            logger.debug(f"🔐 激活状态: {'启用' if is_active else '禁用'}")
+        
+        # 保存完整策略，启用/禁用时直接使用，不必再次请求 Emby
+        policy_json = dump_emby_policy(user_details.get('Policy'))
+    
+    return {
+        'emby_id': emby_id,
+        'name': name,
+        'is_active': is_active,
+        'created_at': date_created,
+        'emby_policy': policy_json,
+        'fingerprint': user_fingerprint(name, is_active, date_created, policy_json)
+    }
+
+def sync_users(full_fetch=False):
     """
     从Emby同步用户到数据库
+    通过比较指纹只写入新增、变化和已从Emby删除的用户
+    :param full_fetch: 是否对每个用户单独请求详情，默认直接使用用户列表中的数据
     :return: (success, message)
     """
     try:
@@ -88,178 +216,388 @@ def sync_users():
         conn = get_db_connection()
         cursor = conn.cursor()
         
-        synced_count = 0
+        # 一次性读取数据库中已有用户的指纹
+        cursor.execute('SELECT id, emby_id, state, fingerprint FROM users WHERE emby_id IS NOT NULL')
+        existing_users = {emby_id: (user_id, state, fingerprint) for user_id, emby_id, state, fingerprint in cursor.fetchall()}
+        
+        batch_size = user_config['sync_batch_size']
+        inserted_count = 0
         updated_count = 0
-        for user in emby_users:
-            emby_id = user['Id']
-            name = user['Name']
-            
-            # 打印用户分隔符
-            logger.info(f"\n{'='*50}")
-            logger.info(f"👤 正在处理用户: {name} (ID: {emby_id})")
-            logger.info(f"{'='*50}")
-            
-            # 获取用户详细信息，包括注册时间和激活状态
-            user_details = get_emby_user_details(emby_id)
-            date_created = None
-            is_active = True
+        unchanged_count = 0
+        fetched_count = 0
+        failed_count = 0
+        seen_emby_ids = set()
+        pending_rows = []
+        
+        def flush_rows():
+            # 新增和变化的用户合并为一条多行 INSERT ... ON DUPLICATE KEY UPDATE（按 emby_id 唯一键），每批提交一次
+            bulk_insert(cursor, 'users', SYNC_COLUMNS, pending_rows, update_columns=SYNC_COLUMNS[1:])
+            commit_user_changes(conn, cursor)
+            logger.info(f"💾 同步写入 {len(pending_rows)} 个用户，已处理 {len(seen_emby_ids)}/{len(emby_users)}，失败 {failed_count}")
+            pending_rows.clear()
+        
+        # 需要补充请求的用户详情由线程池并发获取，数据库按原顺序写入
+        for user, user_details, fetched in iter_emby_user_details(emby_users, full_fetch):
+            if fetched:
+                fetched_count += 1
             
-            if user_details:
-                # 获取注册时间
-                if 'DateCreated' in user_details:
-                    date_created = user_details['DateCreated']
-                    logger.info(f"📅 注册时间: {date_created}")
-                    # 转换ISO 8601格式为MySQL datetime格式
-                    try:
-                        # 解析ISO 8601格式
-                        dt = datetime.datetime.fromisoformat(date_created.replace('Z', '+00:00'))
-                        # 转换为MySQL支持的datetime格式
-                        date_created = dt.strftime('%Y-%m-%d %H:%M:%S')
-                        logger.info(f"🔄 转换后注册时间: {date_created}")
-                    except Exception as e:
-                        logger.warning(f"⚠️  时间格式转换失败: {e}")
-                        date_created = None
-                
-                # 获取激活状态，使用 $.Policy.IsDisabled
-                if 'Policy' in user_details and 'IsDisabled' in user_details['Policy']:
-                    is_active = not user_details['Policy']['IsDisabled']
-                    logger.info(f"🔐 激活状态: {'启用' if is_active else '禁用'}")
+            if user_details is None:
+                # 获取详情失败的用户保持数据库记录和指纹不变，下次同步时重试
+                failed_count += 1
+                seen_emby_ids.add(user['Id'])
+                logger.warning(f"⚠️  获取用户 {user.get('Name')} 的详情失败，本次跳过同步")
+                continue
             
-            # 检查用户是否已存在
-            cursor.execute('SELECT id FROM users WHERE emby_id = %s', (emby_id,))
-            existing_user = cursor.fetchone()
+            row = build_sync_row(user, user_details)
+            emby_id = row['emby_id']
+            seen_emby_ids.add(emby_id)
+            existing_user = existing_users.get(emby_id)
             
             if not existing_user:
-                # 插入新用户
-                # 如果注册时间为空，数据库会使用 DEFAULT CURRENT_TIMESTAMP
-                cursor.execute('''
-                INSERT INTO users (emby_id, name, is_active, state, created_at)
-                VALUES (%s, %s, %s, %s, %s)
-                ''', (emby_id, name, is_active, 1, date_created))
-                synced_count += 1
-            else:
-                # 更新现有用户
-                cursor.execute('''
-                    UPDATE users 
-                    SET name = %s, is_active = %s, state = %s, created_at = %s 
-                    WHERE emby_id = %s
-                    ''', (name, is_active, 1, date_created, emby_id))
+                inserted_count += 1
+            elif existing_user[1] != 1 or existing_user[2] != row['fingerprint']:
+                # 有变化（或已被标记删除后又出现在Emby中）的用户
                 updated_count += 1
+            else:
+                unchanged_count += 1
+                continue
+            
+            pending_rows.append((emby_id, row['name'], row['is_active'], 1, row['created_at'], row['emby_policy'], row['fingerprint']))
+            if len(pending_rows) >= batch_size:
+                flush_rows()
+        
+        if pending_rows:
+            flush_rows()
+        
+        # 数据库中仍有效、但Emby中已不存在的用户标记为已删除
+        removed_ids = [user_id for emby_id, (user_id, state, _) in existing_users.items() if state == 1 and emby_id not in seen_emby_ids]
+        if removed_ids and not emby_users:
+            # Emby 返回空列表时不做删除，避免异常响应清空所有用户
+            logger.warning(f"⚠️  Emby 用户列表为空，跳过 {len(removed_ids)} 个用户的删除标记")
+            removed_ids = []
+        for chunk in iter_chunks(removed_ids, batch_size):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'UPDATE users SET state = 0 WHERE id IN ({placeholders})', chunk)
+            commit_user_changes(conn, cursor)
+        removed_count = len(removed_ids)
         
-        conn.commit()
         cursor.close()
         conn.close()
         
-        return True, f'已从Emby同步 {synced_count} 个用户，更新了 {updated_count} 个现有用户'
+        logger.info(f"📊 同步完成，新增 {inserted_count}，更新 {updated_count}，未变化 {unchanged_count}，删除 {removed_count}，失败 {failed_count}，补充请求用户详情 {fetched_count} 次")
+        return True, f'已从Emby同步用户：新增 {inserted_count} 个，更新 {updated_count} 个，未变化 {unchanged_count} 个，删除 {removed_count} 个，失败 {failed_count} 个，补充请求用户详情 {fetched_count} 次'
     except Exception as e:
         return False, str(e)
 
-def get_users(search_query='', status_filter=None, expire_status=None, page=1, page_size=10):
+def build_user_filters(search_query='', status_filter=None, expire_status=None):
+    """
+    构建用户列表的筛选条件，列表、游标分页和计数查询共用
+    :param search_query: 搜索关键词
+    :param status_filter: 状态过滤
+    :param expire_status: 过期状态过滤
+    :return: (where 子句, 参数列表)
+    """
+    conditions = ['state = 1']
+    params = []
+    
+    if search_query:
+        # 关键词中的 % 和 _ 按普通字符匹配，与内存用户目录的子串匹配一致
+        conditions.append('name LIKE %s')
+        params.append('%' + escape_like(search_query) + '%')
+    
+    if status_filter is not None:
+        # 确保正确处理布尔值
+        is_active = status_filter.lower() == 'true'
+        conditions.append('is_active = %s')
+        params.append(is_active)
+    
+    if expire_status == 'active':
+        # 只查询未过期的用户
+        conditions.append('(expire_date IS NULL OR expire_date >= NOW())')
+    elif expire_status == 'expired':
+        # 只查询已过期的用户
+        conditions.append('expire_date < NOW()')
+    
+    return ' AND '.join(conditions), params
+
+# 只查询列表需要的字段，不读取同步指纹和 Emby 策略
+USER_LIST_COLUMNS = 'id, emby_id, name, email, password, is_active, state, expire_date, created_at, updated_at'
+
+# 用户总数缓存，key 为筛选条件
+_count_cache = TTLCache(maxsize=256)
+
+def load_directory_users():
+    """
+    加载用户目录需要的全部有效用户
+    :return: 按 id 排序的用户记录列表
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor(pymysql.cursors.DictCursor)
+    cursor.execute(f'SELECT {USER_LIST_COLUMNS} FROM users WHERE state = 1 ORDER BY id')
+    users = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return users
+
+# 进程内用户目录，用户列表的搜索、筛选和分页优先在内存中完成
+user_directory = UserDirectory(
+    load_directory_users,
+    get_data_version,
+    version_interval=user_config['directory_version_interval'],
+    max_age=user_config['directory_max_age']
+)
+
+def get_users_version():
+    """
+    获取用户数据版本号，用于用户列表的响应缓存
+    启用用户目录时复用目录的版本检查（按间隔检查，本进程的修改立即生效），否则直接查询
+    :return: int
+    """
+    if user_config['directory_enabled']:
+        try:
+            return user_directory.current_version()
+        except Exception as e:
+            logger.warning(f"⚠️  用户目录不可用，直接查询数据版本号: {e}")
+    return get_data_version()
+
+def search_directory(search_query='', status_filter=None, expire_status=None):
+    """
+    在用户目录中查询符合条件的用户
+    :return: 按 id 排序的用户记录列表，目录未启用或不可用时返回 None
+    """
+    if not user_config['directory_enabled']:
+        return None
+    return user_directory.search(search_query, status_filter, expire_status)
+
+def count_users(cursor, where, params, total_mode='exact', cache_key=None):
+    """
+    统计符合筛选条件的用户数
+    :param cursor: 数据库游标
+    :param where: where 子句
+    :param params: 参数列表
+    :param total_mode: exact 每次查询，cached 使用短时间缓存（可能略有滞后），none 不统计
+    :param cache_key: 缓存 key，cached 模式使用
+    :return: 用户数，none 模式返回 None
+    """
+    if total_mode == 'none':
+        return None
+    
+    def load():
+        cursor.execute(f'SELECT COUNT(*) as total FROM users WHERE {where}', params)
+        result = cursor.fetchone()
+        return result['total'] if result else 0
+    
+    if total_mode == 'cached':
+        return _count_cache.get_or_load(cache_key, load, user_config['list_count_ttl'])
+    return load()
+
+def get_users(search_query='', status_filter=None, expire_status=None, page=1, page_size=10, total_mode='exact'):
     """
     获取用户列表
+    用户记录直接返回查询结果，日期时间字段由 JSON 序列化统一编码为 ISO 8601 格式
     :param search_query: 搜索关键词
     :param status_filter: 状态过滤
     :param expire_status: 过期状态过滤
     :param page: 页码，默认为1
     :param page_size: 每页大小，默认为10
+    :param total_mode: 总数统计方式，exact / cached / none
     :return: dict 包含用户列表和总记录数
+    :raises Exception: 数据库查询出错
     """
     try:
+        # 计算分页偏移量
+        offset = (page - 1) * page_size
+        
+        # 优先使用内存中的用户目录，总数可以直接得到
+        users = search_directory(search_query, status_filter, expire_status)
+        if users is not None:
+            return {
+                'data': users[offset:offset + page_size],
+                'total': None if total_mode == 'none' else len(users),
+                'page': page,
+                'page_size': page_size
+            }
+        
         conn = get_db_connection()
         cursor = conn.cursor(pymysql.cursors.DictCursor)
         
-        # 构建查询
-        base_query = 'SELECT * FROM users WHERE state = 1'
-        count_query = 'SELECT COUNT(*) as total FROM users WHERE state = 1'
-        params = []
-        
-        if search_query:
-            base_query += ' AND name LIKE %s'
-            count_query += ' AND name LIKE %s'
-            params.append('%' + search_query + '%')
-        
-        if status_filter is not None:
-            # 确保正确处理布尔值
-            is_active = status_filter.lower() == 'true'
-            base_query += ' AND is_active = %s'
-            count_query += ' AND is_active = %s'
-            params.append(is_active)
-        
-        if expire_status == 'active':
-            # 只查询未过期的用户
-            base_query += ' AND (expire_date IS NULL OR expire_date >= NOW())'
-            count_query += ' AND (expire_date IS NULL OR expire_date >= NOW())'
-        elif expire_status == 'expired':
-            # 只查询已过期的用户
-            base_query += ' AND expire_date < NOW()'
-            count_query += ' AND expire_date < NOW()'
-        
-        # 计算分页偏移量
-        offset = (page - 1) * page_size
-        base_query += ' LIMIT %s OFFSET %s'
-        params.extend([page_size, offset])
+        where, params = build_user_filters(search_query, status_filter, expire_status)
         
         # 执行计数查询
-        cursor.execute(count_query, params[:-2])  # 排除LIMIT和OFFSET参数
-        total_result = cursor.fetchone()
-        total = total_result['total'] if total_result else 0
+        total = count_users(cursor, where, params, total_mode, (search_query, status_filter, expire_status))
         
-        # 执行分页查询
-        cursor.execute(base_query, params)
+        # 按主键排序保证分页结果稳定（使用 idx_users_state_id 索引）
+        cursor.execute(
+            f'SELECT {USER_LIST_COLUMNS} FROM users WHERE {where} ORDER BY id LIMIT %s OFFSET %s',
+            params + [page_size, offset]
+        )
         users = cursor.fetchall()
         
         cursor.close()
         conn.close()
         
-        # 格式化用户数据中的日期时间字段
-        formatted_users = []
-        for user in users:
-            # 检查用户数据类型
-            if isinstance(user, dict):
-                # 如果是字典，使用键来访问元素
-                formatted_user = {
-                    'id': user.get('id'),
-                    'emby_id': user.get('emby_id'),
-                    'name': user.get('name'),
-                    'email': user.get('email'),
-                    'password': user.get('password'),
-                    'is_active': user.get('is_active'),
-                    'state': user.get('state'),
-                    'expire_date': user.get('expire_date').strftime('%Y-%m-%d %H:%M:%S') if user.get('expire_date') else None,
-                    'created_at': user.get('created_at').strftime('%Y-%m-%d %H:%M:%S') if user.get('created_at') else None,
-                    'updated_at': user.get('updated_at').strftime('%Y-%m-%d %H:%M:%S') if user.get('updated_at') else None
-                }
-            else:
-                # 如果是元组，使用索引来访问元素
-                # 假设元组的顺序是: id, emby_id, name, email, password, is_active, state, expire_date, created_at, updated_at
-                formatted_user = {
-                    'id': user[0],
-                    'emby_id': user[1],
-                    'name': user[2],
-                    'email': user[3],
-                    'password': user[4],
-                    'is_active': user[5],
-                    'state': user[6],
-                    'expire_date': user[7].strftime('%Y-%m-%d %H:%M:%S') if user[7] else None,
-                    'created_at': user[8].strftime('%Y-%m-%d %H:%M:%S'),
-                    'updated_at': user[9].strftime('%Y-%m-%d %H:%M:%S')
-                }
-            formatted_users.append(formatted_user)
-        
         return {
-            'data': formatted_users,
+            'data': users,
             'total': total,
             'page': page,
             'page_size': page_size
         }
     except Exception as e:
+        # 不返回空列表：空结果会被当作正常响应缓存，并通过 ETag 确认给所有客户端
         logger.error(f"❌ 获取用户列表错误: {e}")
-        return {
-            'data': [],
-            'total': 0,
-            'page': page,
-            'page_size': page_size
-        }
+        raise
+
+def encode_cursor(direction, user_id):
+    """
+    生成分页游标，游标对调用方是不透明的字符串
+    :param direction: next 向后翻页，prev 向前翻页
+    :param user_id: 翻页的起点（不包含）
+    :return: str
+    """
+    raw = json.dumps({'d': direction, 'id': user_id}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    解析分页游标
+    :param cursor: encode_cursor 生成的游标
+    :return: (direction, user_id)
+    :raises ValueError: 游标无效
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        direction, user_id = data['d'], int(data['id'])
+    except (ValueError, TypeError, KeyError):
+        raise ValueError('无效的分页游标')
+    if direction not in ('next', 'prev'):
+        raise ValueError('无效的分页游标')
+    return direction, user_id
+
+def get_users_by_cursor(search_query='', status_filter=None, expire_status=None, cursor=None, page_size=10, total_mode='cached'):
+    """
+    使用游标分页获取用户列表，按 id 排序，用 id > / id < 代替 OFFSET，翻到任意深度的代价都相同
+    :param search_query: 搜索关键词
+    :param status_filter: 状态过滤
+    :param expire_status: 过期状态过滤
+    :param cursor: 上一次返回的 next_cursor 或 prev_cursor，为空时返回第一页
+    :param page_size: 每页大小
+    :param total_mode: 总数统计方式，exact / cached / none，默认使用短时间缓存
+    :return: dict 包含用户列表、总记录数和前后页游标
+    :raises ValueError: 游标无效
+    """
+    direction, anchor_id = decode_cursor(cursor) if cursor else ('next', None)
+    page_size = max(1, page_size)
+    
+    # 多取一条用于判断该方向上是否还有数据，结果按翻页方向排序
+    matched = search_directory(search_query, status_filter, expire_status)
+    if matched is not None:
+        total = None if total_mode == 'none' else len(matched)
+        ids = [user['id'] for user in matched]
+        if direction == 'next':
+            start = bisect.bisect_right(ids, anchor_id) if anchor_id is not None else 0
+            users = matched[start:start + page_size + 1]
+        else:
+            end = bisect.bisect_left(ids, anchor_id)
+            users = matched[max(0, end - page_size - 1):end][::-1]
+    else:
+        conn = get_db_connection()
+        db_cursor = conn.cursor(pymysql.cursors.DictCursor)
+        
+        where, params = build_user_filters(search_query, status_filter, expire_status)
+        total = count_users(db_cursor, where, params, total_mode, (search_query, status_filter, expire_status))
+        
+        page_where, page_params = where, list(params)
+        if anchor_id is not None:
+            page_where += ' AND id > %s' if direction == 'next' else ' AND id < %s'
+            page_params.append(anchor_id)
+        order = 'ASC' if direction == 'next' else 'DESC'
+        
+        db_cursor.execute(
+            f'SELECT {USER_LIST_COLUMNS} FROM users WHERE {page_where} ORDER BY id {order} LIMIT %s',
+            page_params + [page_size + 1]
+        )
+        users = list(db_cursor.fetchall())
+        db_cursor.close()
+        conn.close()
+    
+    has_more = len(users) > page_size
+    users = users[:page_size]
+    if direction == 'prev':
+        users.reverse()
+    
+    next_cursor = prev_cursor = None
+    if users:
+        first_id, last_id = users[0]['id'], users[-1]['id']
+        if direction == 'next':
+            next_cursor = encode_cursor('next', last_id) if has_more else None
+            prev_cursor = encode_cursor('prev', first_id) if anchor_id is not None else None
+        else:
+            next_cursor = encode_cursor('next', last_id)
+            prev_cursor = encode_cursor('prev', first_id) if has_more else None
+    
+    return {
+        'data': users,
+        'total': total,
+        'page_size': page_size,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor
+    }
+
+# 导出的字段，不包含密码、同步指纹和 Emby 策略
+EXPORT_COLUMNS = ['id', 'emby_id', 'name', 'email', 'is_active', 'state', 'expire_date', 'created_at', 'updated_at']
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+def iter_users_export(export_format='csv', search_query='', status_filter=None, expire_status=None):
+    """
+    流式导出用户，使用服务端游标逐批读取，内存占用与用户数量无关
+    使用独立连接：生成器在请求上下文结束后才被消费，且导出期间连接不能执行其他查询
+    :param export_format: csv（日期时间为 YYYY-MM-DD HH:MM:SS）或 ndjson（每行一个 JSON 对象，日期时间为 ISO 8601）
+    :param search_query: 搜索关键词
+    :param status_filter: 状态过滤
+    :param expire_status: 过期状态过滤
+    :return: 生成器，逐批返回编码后的 bytes
+    """
+    where, params = build_user_filters(search_query, status_filter, expire_status)
+    batch_size = user_config['export_batch_size']
+    started = time.perf_counter()
+    exported_count = 0
+    
+    conn = create_db_connection(cursorclass=pymysql.cursors.SSCursor)
+    try:
+        cursor = conn.cursor()
+        # 客户端读取缓慢时避免 MySQL 因发送超时中断查询
+        cursor.execute('SET SESSION net_write_timeout = %s', (user_config['export_net_write_timeout'],))
+        cursor.execute(f"SELECT {', '.join(EXPORT_COLUMNS)} FROM users WHERE {where} ORDER BY id", params)
+        
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(EXPORT_COLUMNS)
+            yield buffer.getvalue().encode('utf-8')
+        
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            exported_count += len(rows)
+            
+            if export_format == 'csv':
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(rows)
+                yield buffer.getvalue().encode('utf-8')
+            else:
+                yield b''.join(dumps_bytes(dict(zip(EXPORT_COLUMNS, row))) + b'\n' for row in rows)
+        
+        cursor.close()
+        logger.info(f"📤 导出用户完成: {exported_count} 个，格式 {export_format}，耗时 {time.perf_counter() - started:.3f} 秒")
+    except GeneratorExit:
+        logger.warning(f"⚠️  客户端中断了用户导出，已导出 {exported_count} 个")
+        raise
+    finally:
+        # 未读完的服务端游标直接关闭连接，不再读取剩余结果
+        conn.close()
 
 def create_user(user_data):
     """
@@ -274,16 +612,7 @@ def create_user(user_data):
         expire_date = user_data.get('expire_date', None)
         
         # Convert ISO datetime string to MySQL DATETIME format
-        if expire_date:
-            # Handle ISO format (2026-02-20T01:45:00.000Z)
-            if isinstance(expire_date, str):
-                # Parse ISO string to datetime object
-                try:
-                    dt = datetime.datetime.fromisoformat(expire_date.replace('Z', '+00:00'))
-                    # Convert to MySQL DATETIME format
-                    expire_date = dt.strftime('%Y-%m-%d %H:%M:%S')
-                except:
-                    pass
+        expire_date = normalize_datetime(expire_date)
         
         # 在 Emby 中创建用户
         emby_user_data = {
@@ -298,19 +627,23 @@ def create_user(user_data):
         
         emby_id = emby_response['Id']
         
-        # 在数据库中创建用户
+        # 在数据库中创建用户，同时保存 Emby 返回的策略
         conn = get_db_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
-        INSERT INTO users (emby_id, name, email, password, is_active, state, expire_date)
-        VALUES (%s, %s, %s, %s, %s, %s, %s)
-        ''', (emby_id, name, email, password, True, 1, expire_date))
+        INSERT INTO users (emby_id, name, email, password, is_active, state, expire_date, emby_policy)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ''', (emby_id, name, email, password, True, 1, expire_date, dump_emby_policy(emby_response.get('Policy'))))
+        user_id = cursor.lastrowid
         
-        conn.commit()
+        commit_user_changes(conn, cursor)
         cursor.close()
         conn.close()
         
+        # 通知过期调度器
+        schedule_user_expire(user_id, expire_date)
+        
         return True, '用户创建成功'
     except Exception as e:
         return False, str(e)
@@ -341,16 +674,7 @@ def update_user(user_id, user_data):
             expire_date = user_data['expire_date']
             
             # Convert ISO datetime string to MySQL DATETIME format
-            if expire_date:
-                # Handle ISO format (2026-02-20T01:45:00.000Z)
-                if isinstance(expire_date, str):
-                    # Parse ISO string to datetime object
-                    try:
-                        dt = datetime.datetime.fromisoformat(expire_date.replace('Z', '+00:00'))
-                        # Convert to MySQL DATETIME format
-                        expire_date = dt.strftime('%Y-%m-%d %H:%M:%S')
-                    except:
-                        pass
+            expire_date = normalize_datetime(expire_date)
             
             # 根据过期时间自动设置激活状态
             now = datetime.datetime.now()
@@ -370,15 +694,20 @@ def update_user(user_id, user_data):
                 status_update_success, message = toggle_user_status(user_id, new_active)
                 if not status_update_success:
                     # 状态更新失败，返回错误
+                    cursor.close()
+                    conn.close()
                     return False, message
-            else:
-                # 状态没有变化，只更新过期时间
-                cursor.execute('''
-                    UPDATE users 
-                    SET expire_date = %s, updated_at = CURRENT_TIMESTAMP 
-                    WHERE id = %s
-                ''', (expire_date, user_id))
-                conn.commit()
+            
+            # 更新过期时间（状态变化时同样需要保存新的过期时间）
+            cursor.execute('''
+                UPDATE users 
+                SET expire_date = %s, updated_at = CURRENT_TIMESTAMP 
+                WHERE id = %s
+            ''', (expire_date, user_id))
+            commit_user_changes(conn, cursor)
+            
+            # 通知过期调度器
+            schedule_user_expire(user_id, expire_date if new_active else None)
         
         cursor.close()
         conn.close()
@@ -443,7 +772,7 @@ def delete_user(user_id):
         
         # 从数据库中标记用户为已删除（更新state字段为0）
         cursor.execute('UPDATE users SET state = 0 WHERE id = %s', (user_id,))
-        conn.commit()
+        commit_user_changes(conn, cursor)
         
         cursor.close()
         conn.close()
@@ -452,9 +781,514 @@ def delete_user(user_id):
     except Exception as e:
         return False, str(e)
 
+def map_concurrently(func, items, concurrency):
+    """
+    使用线程池并发执行，按输入顺序返回结果
+    :param func: 处理函数，返回 (success, result)，抛出的异常会转换为 (False, 错误信息)
+    :param items: 参数列表
+    :param concurrency: 并发数
+    :return: 结果列表
+    """
+    def safe_call(item):
+        try:
+            return func(item)
+        except Exception as e:
+            return False, str(e)
+    
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(items)))) as executor:
+        # 工作线程沿用调用方的 Emby 时间预算
+        return list(executor.map(propagate_deadline(safe_call), items))
+
+BULK_ACTIONS = ('enable', 'disable', 'set_expire', 'extend_expire', 'delete')
+
+# 批量延长有效期时允许的最大天数（约 100 年），避免日期超出 datetime 和 MySQL 的范围
+BULK_MAX_EXTEND_DAYS = 36500
+
+def parse_user_ids(user_ids):
+    """
+    校验并去重批量操作的用户ID列表
+    :param user_ids: 用户ID列表，元素为整数或纯数字字符串
+    :return: 去重后的整数ID列表，保持原顺序
+    :raises ValueError: 不是列表，或包含非整数的元素
+    """
+    if not isinstance(user_ids, list):
+        raise ValueError('用户ID必须是列表')
+    parsed = []
+    for user_id in user_ids:
+        if isinstance(user_id, bool):
+            raise ValueError('用户ID格式错误')
+        if isinstance(user_id, int):
+            parsed.append(user_id)
+        elif isinstance(user_id, str) and user_id.isascii() and user_id.isdigit():
+            parsed.append(int(user_id))
+        else:
+            raise ValueError('用户ID格式错误')
+    return list(dict.fromkeys(parsed))
+
+def bulk_update_users(user_ids, action, expire_date=None, days=None):
+    """
+    批量操作用户：并发执行 Emby 请求，数据库修改合并为批量语句
+    :param user_ids: 用户ID列表
+    :param action: 操作类型，enable / disable / set_expire / extend_expire / delete
+    :param expire_date: set_expire 时的过期时间，为空表示永久有效
+    :param days: extend_expire 时延长的天数，已过期的用户从当前时间开始延长
+    :return: (success, result or error_message)，result 包含每个用户的结果和耗时
+    """
+    started = time.perf_counter()
+    
+    if action not in BULK_ACTIONS:
+        return False, f'不支持的批量操作: {action}'
+    try:
+        user_ids = parse_user_ids(user_ids)
+    except ValueError as e:
+        return False, str(e)
+    if not user_ids:
+        return False, '请提供用户ID'
+    if len(user_ids) > user_config['bulk_max_users']:
+        return False, f"单次最多操作 {user_config['bulk_max_users']} 个用户"
+    if action == 'extend_expire':
+        try:
+            days = float(days)
+        except (TypeError, ValueError):
+            return False, '请提供延长天数'
+        if not (math.isfinite(days) and 0 < days <= BULK_MAX_EXTEND_DAYS):
+            return False, '请提供有效的延长天数'
+    if action == 'set_expire':
+        expire_date = normalize_datetime(expire_date) or None
+        try:
+            new_expire = datetime.datetime.strptime(expire_date, '%Y-%m-%d %H:%M:%S') if expire_date else None
+        except ValueError:
+            return False, f'过期时间格式错误: {expire_date}'
+    
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor(pymysql.cursors.DictCursor)
+        
+        placeholders = ', '.join(['%s'] * len(user_ids))
+        cursor.execute(f'''
+            SELECT id, emby_id, name, is_active, expire_date, emby_policy, fingerprint
+            FROM users WHERE id IN ({placeholders}) AND state = 1
+        ''', user_ids)
+        users = {user['id']: user for user in cursor.fetchall()}
+        
+        now = datetime.datetime.now()
+        results = {}
+        plans = []
+        for user_id in user_ids:
+            user = users.get(user_id)
+            if not user:
+                results[user_id] = {'id': user_id, 'success': False, 'message': '用户不存在'}
+                continue
+            
+            plan = {'user': user, 'expire_date': user['expire_date'], 'is_active': bool(user['is_active'])}
+            if action in ('enable', 'disable'):
+                plan['is_active'] = action == 'enable'
+                plan['toggle'] = True
+            elif action in ('set_expire', 'extend_expire'):
+                if action == 'set_expire':
+                    plan['expire_date'] = new_expire
+                elif user['expire_date'] is None:
+                    results[user_id] = {'id': user_id, 'success': True, 'message': '用户永久有效，无需延长'}
+                    continue
+                else:
+                    plan['expire_date'] = max(user['expire_date'], now) + datetime.timedelta(days=days)
+                # 根据过期时间自动设置激活状态，状态有变化时才需要更新 Emby
+                plan['is_active'] = plan['expire_date'] is None or plan['expire_date'] > now
+                plan['toggle'] = plan['is_active'] != bool(user['is_active'])
+            plans.append(plan)
+        
+        def run_emby(plan):
+            user = plan['user']
+            if action == 'delete':
+                return delete_emby_user(user['emby_id'])
+            if plan.get('toggle'):
+                return set_emby_user_active(user['emby_id'], plan['is_active'], user['emby_policy'])
+            return True, user['emby_policy']
+        
+        emby_started = time.perf_counter()
+        emby_results = map_concurrently(run_emby, plans, user_config['bulk_concurrency'])
+        emby_elapsed = time.perf_counter() - emby_started
+        
+        updated_rows = []
+        deleted_ids = []
+        for plan, (success, result) in zip(plans, emby_results):
+            user = plan['user']
+            if not success:
+                results[user['id']] = {'id': user['id'], 'success': False, 'message': f'Emby操作失败: {result}' if result else 'Emby操作失败'}
+                continue
+            
+            results[user['id']] = {'id': user['id'], 'success': True, 'message': '操作成功'}
+            if action == 'delete':
+                deleted_ids.append(user['id'])
+            else:
+                # 状态有变化时保存最新策略并清空同步指纹
+                fingerprint = None if plan.get('toggle') else user['fingerprint']
+                updated_rows.append((user['id'], plan['is_active'], plan['expire_date'], result, fingerprint))
+        
+        db_started = time.perf_counter()
+        for chunk in iter_chunks(updated_rows, user_config['sync_batch_size']):
+            bulk_update(cursor, 'users', 'id', ['is_active', 'expire_date', 'emby_policy', 'fingerprint'], chunk)
+        for chunk in iter_chunks(deleted_ids, user_config['sync_batch_size']):
+            chunk_placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'UPDATE users SET state = 0 WHERE id IN ({chunk_placeholders})', chunk)
+        # 没有写入任何用户时不更新数据版本号，避免其他 worker 无谓地重新加载
+        if updated_rows or deleted_ids:
+            commit_user_changes(conn, cursor)
+        else:
+            conn.commit()
+        db_elapsed = time.perf_counter() - db_started
+        
+        # 通知过期调度器
+        if action in ('set_expire', 'extend_expire'):
+            for user_id, is_active, new_expire_date, _, _ in updated_rows:
+                schedule_user_expire(user_id, new_expire_date if is_active else None)
+        
+        cursor.close()
+        conn.close()
+        
+        ordered_results = [results[user_id] for user_id in user_ids]
+        success_count = sum(1 for result in ordered_results if result['success'])
+        elapsed = time.perf_counter() - started
+        logger.info(f"📦 批量操作 {action} 完成: 成功 {success_count}，失败 {len(ordered_results) - success_count}，耗时 {elapsed:.3f} 秒")
+        return True, {
+            'action': action,
+            'results': ordered_results,
+            'success_count': success_count,
+            'failed_count': len(ordered_results) - success_count,
+            'elapsed_ms': round(elapsed * 1000, 1),
+            'emby_elapsed_ms': round(emby_elapsed * 1000, 1),
+            'db_elapsed_ms': round(db_elapsed * 1000, 1)
+        }
+    except Exception as e:
+        logger.error(f"❌ 批量操作用户错误: {e}")
+        return False, str(e)
+
+# 导入用户时写入的字段，emby_id 为唯一键
+IMPORT_COLUMNS = ['emby_id', 'name', 'email', 'password', 'is_active', 'state', 'expire_date', 'emby_policy']
+
+# CSV 中多于表头的字段
+IMPORT_EXTRA_FIELDS = '__extra__'
+
+def import_text(value, field):
+    """
+    校验导入字段的类型并转换为字符串
+    :param value: 字段值，允许 None、字符串和数字
+    :param field: 字段名，用于错误信息
+    :return: 字符串，None 返回空字符串
+    :raises ValueError: 字段类型错误
+    """
+    if value is None:
+        return ''
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise ValueError(f'{field} 字段类型错误')
+    return str(value)
+
+def parse_import_rows(data, content_type=''):
+    """
+    解析导入数据
+    :param data: CSV 文本（首行为表头），或 JSON 数组 / {"users": [...]}
+    :param content_type: 数据类型，包含 csv 时按 CSV 解析
+    :return: 用户列表，每个用户为包含 name、password、email、expire_date 的 dict
+    :raises ValueError: 数据格式错误
+    """
+    if isinstance(data, bytes):
+        data = data.decode('utf-8-sig')
+    
+    if 'csv' in content_type:
+        # 字段数多于表头时，多出的值放在 IMPORT_EXTRA_FIELDS 中，由 import_users 将该行记为失败
+        reader = csv.DictReader(io.StringIO(data), restkey=IMPORT_EXTRA_FIELDS)
+        if not reader.fieldnames or 'name' not in [field.strip() for field in reader.fieldnames]:
+            raise ValueError('CSV 首行必须是表头，且包含 name 列')
+        return [
+            {key.strip(): value if key == IMPORT_EXTRA_FIELDS else (value or '').strip() for key, value in row.items()}
+            for row in reader
+        ]
+    
+    if isinstance(data, str):
+        data = json.loads(data)
+    if isinstance(data, dict):
+        data = data.get('users')
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        raise ValueError('JSON 数据必须是用户数组，或 {"users": [...]}')
+    return data
+
+def import_users(rows):
+    """
+    批量导入用户：并发在 Emby 中创建用户，创建结果按批写入数据库（创建和写入流水线执行）
+    可以重复执行：数据库中已存在的用户名会跳过；在 Emby 中创建用户前先写入续传标记（import_journal），
+    Emby 中已存在的同名用户只有带续传标记（即之前的导入在写入数据库前中断）时才会被接管并重新设置密码，其余跳过
+    :param rows: 用户列表，每个用户包含 name，可选 password、email、expire_date
+    :return: (success, result or error_message)，result 包含每行的结果、各类数量和吞吐量
+    """
+    started = time.perf_counter()
+    
+    if not rows:
+        return False, '请提供要导入的用户'
+    if len(rows) > user_config['import_max_users']:
+        return False, f"单次最多导入 {user_config['import_max_users']} 个用户"
+    
+    results = [None] * len(rows)
+    candidates = []
+    seen_names = set()
+    for index, row in enumerate(rows):
+        raw_name = row.get('name')
+        result = {'row': index + 1, 'name': raw_name.strip() if isinstance(raw_name, str) else '', 'status': 'failed', 'message': '', 'emby_id': None}
+        results[index] = result
+        
+        # 字段类型错误只影响当前行
+        try:
+            if row.get(IMPORT_EXTRA_FIELDS):
+                raise ValueError('字段数量多于表头')
+            name = import_text(row.get('name'), 'name').strip()
+            password = import_text(row.get('password'), 'password')
+            email = import_text(row.get('email'), 'email')
+            expire_date = row.get('expire_date') or None
+            if expire_date is not None and not isinstance(expire_date, str):
+                raise ValueError('expire_date 字段必须是时间字符串')
+        except ValueError as e:
+            result['message'] = str(e)
+            continue
+        result['name'] = name
+        
+        expire_date = normalize_datetime(expire_date)
+        if not name:
+            result['message'] = '用户名不能为空'
+            continue
+        if name.casefold() in seen_names:
+            result['message'] = '与前面的行用户名重复'
+            continue
+        if expire_date:
+            try:
+                datetime.datetime.strptime(expire_date, '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                result['message'] = f'过期时间格式错误: {expire_date}'
+                continue
+        
+        seen_names.add(name.casefold())
+        candidates.append({
+            'index': index,
+            'name': name,
+            'password': password or '123456',
+            'email': email,
+            'expire_date': expire_date or None
+        })
+    
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # 数据库中已存在的用户名直接跳过，重复导入同一份数据不会重复创建
+        existing_names = set()
+        for chunk in iter_chunks([candidate['name'] for candidate in candidates], user_config['sync_batch_size']):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT name FROM users WHERE name IN ({placeholders}) AND state = 1', chunk)
+            existing_names.update(name.casefold() for (name,) in cursor.fetchall())
+        
+        # Emby 中已存在的同名用户：只接管上次导入在写入数据库前中断留下的用户
+        emby_success, emby_users = get_emby_users()
+        if not emby_success:
+            cursor.close()
+            conn.close()
+            return False, f'获取 Emby 用户列表失败: {emby_users}'
+        emby_users_by_name = {user['Name'].casefold(): user for user in emby_users if user.get('Name')}
+        
+        # 已被数据库中其他记录管理的 Emby 用户不接管
+        matched = [
+            candidate for candidate in candidates
+            if candidate['name'].casefold() not in existing_names and candidate['name'].casefold() in emby_users_by_name
+        ]
+        managed_ids = set()
+        for chunk in iter_chunks([emby_users_by_name[candidate['name'].casefold()]['Id'] for candidate in matched], user_config['sync_batch_size']):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT emby_id FROM users WHERE emby_id IN ({placeholders}) AND state = 1', chunk)
+            managed_ids.update(emby_id for (emby_id,) in cursor.fetchall())
+        
+        # 有续传标记的用户名才是之前的导入创建的
+        journal_names = set()
+        for chunk in iter_chunks([candidate['name'] for candidate in matched], user_config['sync_batch_size']):
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f'SELECT name FROM import_journal WHERE name IN ({placeholders})', chunk)
+            journal_names.update(name.casefold() for (name,) in cursor.fetchall())
+        
+        pending_rows = []
+        pending_candidates = []
+        to_create = []
+        db_elapsed = 0.0
+        
+        def flush_rows():
+            nonlocal db_elapsed
+            if not pending_rows:
+                return
+            db_started = time.perf_counter()
+            try:
+                # 被标记删除的同一 Emby 用户重新导入时恢复为有效，续传标记在同一事务中删除
+                bulk_insert(cursor, 'users', IMPORT_COLUMNS, pending_rows, update_columns=IMPORT_COLUMNS[1:])
+                placeholders = ', '.join(['%s'] * len(pending_candidates))
+                cursor.execute(f'DELETE FROM import_journal WHERE name IN ({placeholders})', [candidate['name'] for candidate in pending_candidates])
+                commit_user_changes(conn, cursor)
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"❌ 导入用户写入数据库失败: {e}")
+                for candidate in pending_candidates:
+                    result = results[candidate['index']]
+                    result['status'] = 'failed'
+                    result['message'] = f'已在Emby中创建，写入数据库失败（重新导入时会自动接管）: {e}'
+            else:
+                # 通知过期调度器
+                expiring = [candidate for candidate in pending_candidates if candidate['expire_date']]
+                if expiring:
+                    placeholders = ', '.join(['%s'] * len(expiring))
+                    cursor.execute(f'SELECT emby_id, id FROM users WHERE emby_id IN ({placeholders})', [candidate['emby_id'] for candidate in expiring])
+                    user_ids = dict(cursor.fetchall())
+                    for candidate in expiring:
+                        if candidate['emby_id'] in user_ids:
+                            schedule_user_expire(user_ids[candidate['emby_id']], candidate['expire_date'])
+            db_elapsed += time.perf_counter() - db_started
+            pending_rows.clear()
+            pending_candidates.clear()
+        
+        def add_pending(candidate, emby_user, status, message):
+            candidate['emby_id'] = emby_user['Id']
+            result = results[candidate['index']]
+            result.update({'status': status, 'message': message, 'emby_id': emby_user['Id']})
+            pending_rows.append((
+                emby_user['Id'], candidate['name'], candidate['email'], candidate['password'],
+                True, 1, candidate['expire_date'], dump_emby_policy(emby_user.get('Policy'))
+            ))
+            pending_candidates.append(candidate)
+            if len(pending_rows) >= user_config['import_batch_size']:
+                flush_rows()
+        
+        for candidate in candidates:
+            key = candidate['name'].casefold()
+            if key in existing_names:
+                results[candidate['index']].update({'status': 'skipped', 'message': '用户已存在'})
+            elif key in emby_users_by_name:
+                emby_user = emby_users_by_name[key]
+                if emby_user['Id'] in managed_ids:
+                    results[candidate['index']].update({'status': 'skipped', 'message': 'Emby 中已存在同名用户，且已由其他记录管理'})
+                elif key not in journal_names:
+                    results[candidate['index']].update({'status': 'skipped', 'message': 'Emby 中已存在同名用户，且不是由导入创建的，未导入'})
+                else:
+                    candidate['emby_user'] = emby_user
+                    to_create.append(candidate)
+            else:
+                to_create.append(candidate)
+        
+        # 在 Emby 中创建用户前先写入续传标记，创建后、写入数据库前中断时，重新导入可以接管这些用户
+        # 创建失败时保留标记：请求超时等情况下 Emby 可能已经创建了用户
+        new_names = [candidate['name'] for candidate in to_create if 'emby_user' not in candidate]
+        for chunk in iter_chunks(new_names, user_config['sync_batch_size']):
+            bulk_insert(cursor, 'import_journal', ['name'], [(name,) for name in chunk], update_columns=['name'])
+        conn.commit()
+        
+        def adopt_one(candidate):
+            """
+            接管带续传标记的 Emby 用户：管理员和模板用户不接管，接管时重新设置密码，保证与数据库中保存的密码一致
+            """
+            emby_user = candidate['emby_user']
+            policy = emby_user.get('Policy')
+            if policy is None:
+                success, user_info = get_emby_user_info(emby_user['Id'], use_cache=False)
+                if not success:
+                    return 'failed', f'读取 Emby 用户信息失败: {user_info}'
+                emby_user = user_info
+                policy = user_info.get('Policy') or {}
+            if policy.get('IsAdministrator') or emby_user['Id'] == emby_config.get('template_user_id'):
+                return 'skipped', 'Emby 中已存在同名的管理员或模板用户，未导入'
+            
+            success, error_msg = set_emby_user_password(emby_user['Id'], candidate['password'])
+            if not success:
+                return 'failed', f'接管 Emby 中已存在的用户时设置密码失败: {error_msg}'
+            return 'adopted', emby_user
+        
+        def import_one(candidate):
+            try:
+                if 'emby_user' in candidate:
+                    return adopt_one(candidate)
+                success, response = create_emby_user({'Name': candidate['name'], 'Password': candidate['password']})
+                if success:
+                    return 'created', response
+                error_message = response.get('error', '未知错误') if isinstance(response, dict) else response
+                return 'failed', f'在Emby中创建用户失败: {error_message}'
+            except Exception as e:
+                return 'failed', f'在Emby中创建用户失败: {e}'
+        
+        # 线程池并发创建（或接管）Emby 用户，主线程按顺序取结果并按批写入数据库，写入期间其余用户继续创建
+        if to_create:
+            with ThreadPoolExecutor(max_workers=max(1, min(user_config['import_concurrency'], len(to_create)))) as executor:
+                for candidate, (status, response) in zip(to_create, executor.map(propagate_deadline(import_one), to_create)):
+                    if status == 'created':
+                        add_pending(candidate, response, 'created', '创建成功')
+                    elif status == 'adopted':
+                        add_pending(candidate, response, 'adopted', 'Emby 中已存在之前导入创建的同名用户，已接管并重新设置密码')
+                    else:
+                        results[candidate['index']].update({'status': status, 'message': response})
+        flush_rows()
+        
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        logger.error(f"❌ 导入用户错误: {e}")
+        return False, str(e)
+    
+    counts = {status: 0 for status in ('created', 'adopted', 'skipped', 'failed')}
+    for result in results:
+        counts[result['status']] += 1
+    elapsed = time.perf_counter() - started
+    imported_count = counts['created'] + counts['adopted']
+    logger.info(f"📥 导入用户完成: 创建 {counts['created']}，接管 {counts['adopted']}，跳过 {counts['skipped']}，失败 {counts['failed']}，耗时 {elapsed:.3f} 秒")
+    return True, {
+        'results': results,
+        'created_count': counts['created'],
+        'adopted_count': counts['adopted'],
+        'skipped_count': counts['skipped'],
+        'failed_count': counts['failed'],
+        'elapsed_ms': round(elapsed * 1000, 1),
+        'db_elapsed_ms': round(db_elapsed * 1000, 1),
+        'users_per_second': round(imported_count / elapsed, 1) if elapsed > 0 else None
+    }
+
+def disable_users(conn, users, concurrency):
+    """
+    并发禁用一批用户，并用批量语句记录禁用成功的用户
+    :param conn: 数据库连接
+    :param users: 用户列表，每个用户包含 id、emby_id、name、emby_policy
+    :param concurrency: 并发请求 Emby 的线程数
+    :return: 禁用成功的用户ID列表
+    """
+    results = map_concurrently(
+        lambda user: set_emby_user_active(user['emby_id'], False, user['emby_policy']),
+        users,
+        concurrency
+    )
+    
+    disabled_rows = []
+    for user, (success, result) in zip(users, results):
+        if success:
+            disabled_rows.append((user['id'], False, result, None))
+            logger.info(f"✅ 用户 {user['name']} 已成功禁用")
+        else:
+            logger.error(f"❌ 禁用用户 {user['name']} 失败: {result}")
+    
+    # 保存最新策略并清空同步指纹，每批一条语句
+    cursor = conn.cursor()
+    for chunk in iter_chunks(disabled_rows, user_config['sync_batch_size']):
+        bulk_update(cursor, 'users', 'id', ['is_active', 'emby_policy', 'fingerprint'], chunk)
+    if disabled_rows:
+        commit_user_changes(conn, cursor)
+    else:
+        conn.commit()
+    cursor.close()
+    
+    return [row[0] for row in disabled_rows]
+
 def check_expire():
     """
     检查用户有效期并禁用过期用户
+    过期用户在 Emby 中并发禁用，数据库修改合并为批量语句
     :return: (success, message)
     """
     try:
@@ -463,35 +1297,24 @@ def check_expire():
         
         # 查询过期且仍处于激活状态的用户
         cursor.execute('''
-        SELECT id, emby_id, name 
+        SELECT id, emby_id, name, emby_policy 
         FROM users 
         WHERE expire_date < NOW() AND is_active = TRUE AND state = 1
         ''')
         expired_users = cursor.fetchall()
-        
-        disabled_count = 0
+        cursor.close()
         
         for user in expired_users:
-            user_id = user['id']
-            emby_id = user['emby_id']
-            name = user['name']
-            
-            logger.info(f"🔍 检查过期用户: {name} (ID: {user_id}, Emby ID: {emby_id})")
-            
-            # 使用公共方法禁用用户
-            logger.info(f"🚫 正在禁用用户: {name}")
-            success, message = toggle_user_status(user_id, False)
-            if success:
-                disabled_count += 1
-                logger.info(f"✅ 用户 {name} 已成功禁用")
-            else:
-                logger.error(f"❌ 禁用用户 {name} 失败: {message}")
+            logger.info(f"🔍 检查过期用户: {user['name']} (ID: {user['id']}, Emby ID: {user['emby_id']})")
         
-        conn.commit()
-        
-        cursor.close()
+        started = time.perf_counter()
+        disabled_ids = disable_users(conn, expired_users, user_config['expire_concurrency'])
         conn.close()
         
-        return True, f'已禁用 {disabled_count} 个过期用户'
+        failed_count = len(expired_users) - len(disabled_ids)
+        logger.info(f"⏰ 过期检查完成: 禁用 {len(disabled_ids)} 个，失败 {failed_count} 个，耗时 {time.perf_counter() - started:.3f} 秒")
+        if failed_count:
+            return True, f'已禁用 {len(disabled_ids)} 个过期用户，{failed_count} 个禁用失败'
+        return True, f'已禁用 {len(disabled_ids)} 个过期用户'
     except Exception as e:
         return False, str(e)
@@ -0,0 +1,159 @@
+"""
+基于模拟 Emby 服务器的性能基准，统计耗时和各接口的调用次数，并校验调用次数预算
+
+场景：
+    fetch         只执行同步的 Emby 阶段（获取用户列表和补充详情），不需要数据库
+    sync          执行 sync_users，需要配置好的 MySQL（DB_* 环境变量）
+    check-expire  先同步用户，再将 --expired 个用户设为已过期并执行 check_expire，需要 MySQL
+
+注意：sync 和 check-expire 会写入配置的数据库，请使用单独的测试库
+
+用法：
+    python -m tools.bench_emby fetch --users 3000 --latency 0.01
+    python -m tools.bench_emby sync --users 3000 --budget "GET /emby/Users/{id}=0"
+    python -m tools.bench_emby check-expire --users 1000 --expired 200
+"""
+import os
+import sys
+import time
+import argparse
+
+# 保证以脚本方式运行时也能导入 backend 下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tools.fake_emby_server import FakeEmbyServer
+
+# 各场景默认的调用次数预算，{接口: 最大调用次数}，值为函数时根据参数计算
+DEFAULT_BUDGETS = {
+    'fetch': {
+        'GET /emby/Users': 1,
+        'GET /emby/Users/{id}': lambda args: args.users + 1 if args.minimal_list or args.full_fetch else 0,
+    },
+    'sync': {
+        'GET /emby/Users': 1,
+        'GET /emby/Users/{id}': lambda args: args.users + 1 if args.minimal_list or args.full_fetch else 0,
+    },
+    'check-expire': {
+        # 同步后数据库中已保存策略，禁用用户无需再读取
+        'GET /emby/Users/{id}': 0,
+        'POST /emby/Users/{id}/Policy': lambda args: args.expired,
+    },
+}
+
+def parse_budgets(args):
+    budgets = {}
+    for endpoint, limit in DEFAULT_BUDGETS.get(args.scenario, {}).items():
+        budgets[endpoint] = limit(args) if callable(limit) else limit
+    for item in args.budget:
+        endpoint, _, limit = item.rpartition('=')
+        budgets[endpoint.strip()] = int(limit)
+    return budgets
+
+def run_fetch(args):
+    from services.emby_service import get_emby_users
+    from services.user_service import iter_emby_user_details
+
+    success, emby_users = get_emby_users()
+    if not success:
+        raise RuntimeError(emby_users)
+    for _ in iter_emby_user_details(emby_users, full_fetch=args.full_fetch):
+        pass
+
+def run_sync(args):
+    from services.user_service import sync_users
+
+    success, message = sync_users(args.full_fetch)
+    if not success:
+        raise RuntimeError(message)
+    print(message)
+
+def prepare_check_expire(args, server):
+    from services.user_service import sync_users
+    from utils.database import get_db_connection
+
+    success, message = sync_users()
+    if not success:
+        raise RuntimeError(message)
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('UPDATE users SET expire_date = NULL WHERE state = 1')
+    cursor.execute('''
+        UPDATE users SET is_active = TRUE, expire_date = NOW() - INTERVAL 1 DAY
+        WHERE state = 1 AND emby_id <> %s
+        LIMIT %s
+    ''', (server.template_user_id, args.expired))
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+    # 被标记为过期的用户在 Emby 中也置为启用，保证 check_expire 有实际工作要做
+    for user in server.users.values():
+        user['Policy']['IsDisabled'] = False
+
+def run_check_expire(args):
+    from services.user_service import check_expire
+
+    success, message = check_expire()
+    if not success:
+        raise RuntimeError(message)
+    print(message)
+
+SCENARIOS = {
+    'fetch': (None, run_fetch),
+    'sync': (None, run_sync),
+    'check-expire': (prepare_check_expire, run_check_expire),
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='基于模拟 Emby 服务器的性能基准')
+    parser.add_argument('scenario', choices=sorted(SCENARIOS))
+    parser.add_argument('--users', type=int, default=1000, help='模拟用户数量')
+    parser.add_argument('--expired', type=int, default=100, help='check-expire 场景中过期用户数量')
+    parser.add_argument('--latency', type=float, default=0.005, help='模拟服务器基础延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='模拟服务器随机附加延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='模拟服务器返回 500 的概率')
+    parser.add_argument('--minimal-list', action='store_true', help='/emby/Users 列表不返回 DateCreated 和 Policy')
+    parser.add_argument('--full-fetch', action='store_true', help='同步时对每个用户单独请求详情')
+    parser.add_argument('--budget', action='append', default=[], metavar='ENDPOINT=N',
+                        help='接口调用次数上限，如 "GET /emby/Users/{id}=0"，可重复指定')
+    args = parser.parse_args()
+
+    server = FakeEmbyServer(
+        users=args.users, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, list_full_fields=not args.minimal_list, seed=42
+    ).start()
+
+    # 必须在导入 services 之前设置，配置在导入时读取
+    os.environ['EMBY_URL'] = server.url
+    os.environ['EMBY_API_KEY'] = ''
+    os.environ['EMBY_TEMPLATE_USER_ID'] = server.template_user_id
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    prepare, run = SCENARIOS[args.scenario]
+    try:
+        if prepare:
+            prepare(args, server)
+        server.reset_counts()
+
+        started = time.perf_counter()
+        run(args)
+        elapsed = time.perf_counter() - started
+    finally:
+        server.stop()
+
+    counts = server.call_counts()
+    print(f'场景: {args.scenario}，用户数: {args.users}，耗时: {elapsed:.3f} 秒')
+    for endpoint, count in sorted(counts.items()):
+        print(f'  {endpoint}: {count}')
+
+    failed = False
+    for endpoint, limit in parse_budgets(args).items():
+        count = counts.get(endpoint, 0)
+        if count > limit:
+            failed = True
+            print(f'超出预算: {endpoint} 调用 {count} 次，上限 {limit} 次')
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,298 @@
+"""
+本地模拟 Emby 服务器，用于在没有真实 Emby 的情况下测试 emby_service 和做性能基准
+
+实现了 emby_service 用到的接口：
+    GET    /emby/System/Info
+    GET    /emby/Users
+    GET    /emby/Users/{id}
+    POST   /emby/Users/New
+    POST   /emby/Users/{id}/Password
+    POST   /emby/Users/{id}/Policy
+    DELETE /emby/Users/{id}
+
+辅助接口：
+    GET    /__stats   按接口统计的调用次数
+    POST   /__reset   清空调用次数
+
+用法：
+    python -m tools.fake_emby_server --port 8096 --users 3000 --latency 0.02 --error-rate 0.01
+"""
+import re
+import json
+import time
+import uuid
+import random
+import argparse
+import datetime
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 路由表：(方法, 路径正则, 统计用的接口名, 处理函数名)
+ROUTES = [
+    ('GET', re.compile(r'^/emby/System/Info$'), 'GET /emby/System/Info', 'system_info'),
+    ('GET', re.compile(r'^/emby/Users$'), 'GET /emby/Users', 'list_users'),
+    ('POST', re.compile(r'^/emby/Users/New$'), 'POST /emby/Users/New', 'create_user'),
+    ('GET', re.compile(r'^/emby/Users/(?P<user_id>[^/]+)$'), 'GET /emby/Users/{id}', 'get_user'),
+    ('POST', re.compile(r'^/emby/Users/(?P<user_id>[^/]+)/Password$'), 'POST /emby/Users/{id}/Password', 'set_password'),
+    ('POST', re.compile(r'^/emby/Users/(?P<user_id>[^/]+)/Policy$'), 'POST /emby/Users/{id}/Policy', 'set_policy'),
+    ('DELETE', re.compile(r'^/emby/Users/(?P<user_id>[^/]+)$'), 'DELETE /emby/Users/{id}', 'delete_user'),
+]
+
+class FakeEmbyServer:
+    def __init__(self, host='127.0.0.1', port=0, users=100, api_key='', latency=0.0, jitter=0.0,
+                 error_rate=0.0, slow_rate=0.0, slow_latency=1.0, disabled_rate=0.1,
+                 list_full_fields=True, seed=None):
+        """
+        初始化模拟服务器
+        :param host: 监听地址
+        :param port: 监听端口，0 表示随机端口
+        :param users: 预置的模拟用户数量（另外会额外创建一个模板用户）
+        :param api_key: 要求请求携带的 X-Emby-Token，为空时不校验
+        :param latency: 每个请求的基础延迟（秒）
+        :param jitter: 在基础延迟上随机增加 0~jitter 秒
+        :param error_rate: 返回 500 的概率
+        :param slow_rate: 慢请求的概率
+        :param slow_latency: 慢请求额外增加的延迟（秒）
+        :param disabled_rate: 预置用户中被禁用用户的比例
+        :param list_full_fields: /emby/Users 列表是否返回 DateCreated 和 Policy
+        :param seed: 随机数种子
+        """
+        self.api_key = api_key
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.list_full_fields = list_full_fields
+        self.random = random.Random(seed)
+
+        self.users = {}
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+        self.template_user_id = self._add_user('template', is_disabled=False)['Id']
+        for i in range(users):
+            self._add_user(f'user{i:05d}', is_disabled=self.random.random() < disabled_rate)
+
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        在后台线程中启动服务器
+        :return: self
+        """
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='fake-emby-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def call_counts(self):
+        """
+        获取按接口统计的调用次数
+        :return: dict
+        """
+        with self._lock:
+            return dict(self.calls)
+
+    def reset_counts(self):
+        with self._lock:
+            self.calls.clear()
+
+    def _add_user(self, name, is_disabled=False, policy=None):
+        user_id = uuid.uuid4().hex
+        created = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=self.random.randint(0, 1000))
+        policy = dict(policy) if policy else {
+            'IsAdministrator': False,
+            'IsHidden': True,
+            'EnableRemoteAccess': True,
+            'EnableMediaPlayback': True,
+            'EnableContentDownloading': False,
+        }
+        policy['IsDisabled'] = is_disabled
+        user = {
+            'Name': name,
+            'ServerId': 'fake-emby',
+            'Id': user_id,
+            'HasPassword': False,
+            'DateCreated': created.strftime('%Y-%m-%dT%H:%M:%S.0000000Z'),
+            'Policy': policy,
+        }
+        self.users[user_id] = user
+        return user
+
+    def _list_entry(self, user):
+        if self.list_full_fields:
+            return user
+        return {key: value for key, value in user.items() if key not in ('DateCreated', 'Policy')}
+
+    # 各接口处理函数，返回 (状态码, 响应数据)
+    def system_info(self, body):
+        return 200, {'ServerName': 'Fake Emby', 'Version': '4.8.0.0', 'OperatingSystem': 'Linux', 'Id': 'fake-emby'}
+
+    def list_users(self, body):
+        return 200, [self._list_entry(user) for user in self.users.values()]
+
+    def get_user(self, body, user_id):
+        user = self.users.get(user_id)
+        if not user:
+            return 404, 'User not found'
+        return 200, user
+
+    def create_user(self, body):
+        name = (body or {}).get('Name')
+        if not name:
+            return 400, 'Name is required'
+        if any(user['Name'] == name for user in self.users.values()):
+            return 400, f'A user with the name {name} already exists'
+        template = self.users.get((body or {}).get('CopyFromUserId'))
+        policy = template['Policy'] if template else None
+        return 200, self._add_user(name, policy=policy)
+
+    def set_password(self, body, user_id):
+        user = self.users.get(user_id)
+        if not user:
+            return 404, 'User not found'
+        user['HasPassword'] = bool((body or {}).get('NewPw'))
+        return 204, None
+
+    def set_policy(self, body, user_id):
+        user = self.users.get(user_id)
+        if not user:
+            return 404, 'User not found'
+        if not isinstance(body, dict):
+            return 400, 'Invalid policy'
+        user['Policy'] = body
+        return 204, None
+
+    def delete_user(self, body, user_id):
+        if self.users.pop(user_id, None) is None:
+            return 404, 'User not found'
+        return 204, None
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 响应头和响应体分两次写入，关闭 Nagle 避免与 keep-alive 客户端的延迟确认叠加
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                self._dispatch('GET')
+
+            def do_POST(self):
+                self._dispatch('POST')
+
+            def do_DELETE(self):
+                self._dispatch('DELETE')
+
+            def log_message(self, format, *args):
+                pass
+
+            def _dispatch(self, method):
+                path = self.path.split('?', 1)[0]
+                length = int(self.headers.get('Content-Length') or 0)
+                raw_body = self.rfile.read(length) if length else b''
+
+                if path == '/__stats' and method == 'GET':
+                    return self._send(200, server.call_counts())
+                if path == '/__reset' and method == 'POST':
+                    server.reset_counts()
+                    return self._send(204, None)
+
+                for route_method, pattern, endpoint, handler_name in ROUTES:
+                    match = pattern.match(path)
+                    if route_method == method and match:
+                        break
+                else:
+                    return self._send(404, 'Not found')
+
+                with server._lock:
+                    server.calls[endpoint] += 1
+
+                delay = server.latency + server.random.uniform(0, server.jitter)
+                if server.slow_rate and server.random.random() < server.slow_rate:
+                    delay += server.slow_latency
+                if delay:
+                    time.sleep(delay)
+
+                if server.api_key and self.headers.get('X-Emby-Token') != server.api_key:
+                    return self._send(401, 'Access token is invalid or expired.')
+                if server.error_rate and server.random.random() < server.error_rate:
+                    return self._send(500, 'Injected error')
+
+                try:
+                    body = json.loads(raw_body) if raw_body else None
+                except ValueError:
+                    return self._send(400, 'Invalid JSON')
+
+                with server._lock:
+                    status, data = getattr(server, handler_name)(body, **match.groupdict())
+                self._send(status, data)
+
+            def _send(self, status, data):
+                if data is None:
+                    payload = b''
+                elif isinstance(data, str):
+                    payload = data.encode('utf-8')
+                else:
+                    payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+                self.send_response(status)
+                content_type = 'text/plain' if isinstance(data, str) else 'application/json'
+                self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if payload:
+                    self.wfile.write(payload)
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟 Emby 服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8096)
+    parser.add_argument('--users', type=int, default=100, help='预置用户数量')
+    parser.add_argument('--api-key', default='', help='要求请求携带的 API 密钥，为空时不校验')
+    parser.add_argument('--latency', type=float, default=0.0, help='基础延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='随机附加延迟上限（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='返回 500 的概率')
+    parser.add_argument('--slow-rate', type=float, default=0.0, help='慢请求的概率')
+    parser.add_argument('--slow-latency', type=float, default=1.0, help='慢请求额外延迟（秒）')
+    parser.add_argument('--minimal-list', action='store_true', help='/emby/Users 列表不返回 DateCreated 和 Policy')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+
+    server = FakeEmbyServer(
+        host=args.host, port=args.port, users=args.users, api_key=args.api_key,
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency,
+        list_full_fields=not args.minimal_list, seed=args.seed
+    )
+    print(f'Fake Emby 服务器已启动: {server.url}，模板用户 ID: {server.template_user_id}，用户数: {args.users}')
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+数据库迁移命令行工具
+
+命令：
+    migrate   执行未执行过的迁移（默认）
+    status    查看各迁移的执行状态
+    explain   对热点查询执行 EXPLAIN，有查询未使用索引时退出码为 1
+
+用法：
+    python -m tools.migrate
+    python -m tools.migrate status
+    python -m tools.migrate explain
+"""
+import os
+import sys
+import argparse
+
+# 保证以脚本方式运行时也能导入 backend 下的模块
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.migrations import run_migrations, get_migration_status, explain_hot_queries
+
+def main():
+    parser = argparse.ArgumentParser(description='数据库迁移命令行工具')
+    parser.add_argument('command', nargs='?', default='migrate', choices=['migrate', 'status', 'explain'])
+    args = parser.parse_args()
+
+    if args.command == 'migrate':
+        success, message = run_migrations()
+        print(message)
+        sys.exit(0 if success else 1)
+
+    if args.command == 'status':
+        for item in get_migration_status():
+            applied_at = item['applied_at'] or '未执行'
+            print(f"{item['version']:>4}  {item['name']}  {applied_at}")
+        return
+
+    failed = False
+    for item in explain_hot_queries():
+        flag = '全表扫描' if item['full_scan'] else 'OK'
+        failed = failed or item['full_scan']
+        print(f"[{flag}] {item['name']}: type={item['type']} key={item['key']} rows={item['rows']} extra={item['extra']}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == '__main__':
+    main()
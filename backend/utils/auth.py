@@ -1,8 +1,198 @@
+import time
+import hashlib
+import threading
 import jwt
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
-from config.auth import SECRET_KEY
+from config.auth import SECRET_KEY, TOKEN_CACHE_MAXSIZE, TOKEN_REVOCATION_CHECK_INTERVAL
+from utils.logger import logger
+
+# 检查吊销列表失败（如数据库不可用）后，下次检查前等待的时间（秒），避免每个请求都阻塞在数据库连接上
+REVOCATION_RETRY_INTERVAL = 30
+
+def token_digest(token):
+    """
+    计算 token 摘要，缓存和吊销列表中只保存摘要，不保存 token 原文
+    :param token: token字符串
+    :return: sha256 十六进制字符串
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def load_revoked_tokens():
+    """
+    从数据库读取未过期的已吊销 token
+    :return: {摘要: 过期时间戳}
+    """
+    from utils.database import get_db_connection
+
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT digest, expires_at FROM revoked_tokens WHERE expires_at > NOW()')
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return {digest: expires_at.timestamp() for digest, expires_at in rows}
+
+def get_revocation_version():
+    from utils.database import get_data_version
+    return get_data_version('revoked_tokens')
+
+class VerifiedTokenCache:
+    def __init__(self, maxsize=1024, revocation_loader=None, version_loader=None, check_interval=1.0):
+        """
+        已验证 token 的 LRU 缓存：命中时无需再做 HS256 验签和解码，缓存条目在 token 的 exp 时刻失效
+        吊销列表保存在数据库中，数据版本号变化（任意 worker 执行了登出）时重新加载
+        :param maxsize: 最大缓存条目数
+        :param revocation_loader: 加载吊销列表的函数，返回 {摘要: 过期时间戳}，为空时只使用本进程的吊销列表
+        :param version_loader: 读取吊销列表数据版本号的函数
+        :param check_interval: 检查吊销列表数据版本号的最小间隔（秒）
+        """
+        self.maxsize = maxsize
+        self.revocation_loader = revocation_loader
+        self.version_loader = version_loader
+        self.check_interval = check_interval
+
+        # {摘要: (exp 时间戳, payload)}
+        self._data = OrderedDict()
+        self._revoked = {}
+        self._version = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+        # 统计数据
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, digest):
+        """
+        读取已验证的 token
+        :param digest: token 摘要
+        :return: payload，未命中、已过期或已吊销时返回 None
+        """
+        self._refresh_revocations()
+        now = time.time()
+        with self._lock:
+            item = self._data.get(digest)
+            if item is None:
+                self._misses += 1
+                return None
+            exp, payload = item
+            if exp <= now:
+                del self._data[digest]
+                self._misses += 1
+                return None
+            self._data.move_to_end(digest)
+            self._hits += 1
+            return payload
+
+    def put(self, digest, payload):
+        """
+        缓存验证通过的 token，已吊销或没有 exp 的 token 不缓存
+        :param digest: token 摘要
+        :param payload: 解码后的 payload
+        """
+        exp = payload.get('exp')
+        if not isinstance(exp, (int, float)):
+            return
+        with self._lock:
+            if digest in self._revoked:
+                return
+            self._data[digest] = (exp, payload)
+            self._data.move_to_end(digest)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def is_revoked(self, digest):
+        """
+        判断 token 是否已被吊销
+        :param digest: token 摘要
+        :return: bool
+        """
+        self._refresh_revocations()
+        return digest in self._revoked
+
+    def revoke(self, digest, exp):
+        """
+        在本进程中吊销 token，其他进程通过数据库中的吊销列表得知
+        :param digest: token 摘要
+        :param exp: token 过期时间戳，过期后从吊销列表中移除
+        """
+        with self._lock:
+            self._revoked[digest] = exp
+            self._data.pop(digest, None)
+
+    def clear(self):
+        """
+        清空缓存（如更换密钥后），之后的请求重新验签
+        """
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """
+        获取缓存统计数据
+        :return: dict
+        """
+        with self._lock:
+            total = self._hits + self._misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / total, 4) if total else None,
+                'revoked': len(self._revoked),
+                'revocation_version': self._version
+            }
+
+    def _refresh_revocations(self):
+        """
+        按间隔检查吊销列表的数据版本号，变化时重新加载
+        同一时间只有一个线程检查，其余线程继续使用当前的吊销列表，不会阻塞
+        """
+        if self.version_loader is None or time.monotonic() < self._next_check:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            if time.monotonic() < self._next_check:
+                return
+            version = self.version_loader()
+            if version != self._version:
+                revoked = self.revocation_loader()
+                now = time.time()
+                with self._lock:
+                    # 保留本进程刚吊销、尚未读到的条目
+                    for digest, exp in self._revoked.items():
+                        if exp > now:
+                            revoked.setdefault(digest, exp)
+                    self._revoked = revoked
+                    for digest in revoked:
+                        self._data.pop(digest, None)
+                self._version = version
+            self._next_check = time.monotonic() + self.check_interval
+        except Exception as e:
+            self._next_check = time.monotonic() + REVOCATION_RETRY_INTERVAL
+            logger.warning(f"⚠️  检查 token 吊销列表失败，{REVOCATION_RETRY_INTERVAL} 秒后重试: {e}")
+        finally:
+            self._refresh_lock.release()
+
+_token_cache = VerifiedTokenCache(
+    maxsize=TOKEN_CACHE_MAXSIZE,
+    revocation_loader=load_revoked_tokens,
+    version_loader=get_revocation_version,
+    check_interval=TOKEN_REVOCATION_CHECK_INTERVAL
+)
+
+def get_token_cache_stats():
+    """
+    获取已验证 token 缓存的统计数据
+    :return: dict
+    """
+    return _token_cache.stats()
 
 def generate_token(username):
     """
@@ -17,6 +207,24 @@ def generate_token(username):
     )
     return token
 
+def decode_token(token):
+    """
+    验证并解码JWT token，已验证的 token 直接从缓存读取
+    :param token: token字符串
+    :return: payload
+    :raises jwt.InvalidTokenError: token 无效、已过期或已吊销
+    """
+    digest = token_digest(token)
+    payload = _token_cache.get(digest)
+    if payload is not None:
+        return payload
+
+    if _token_cache.is_revoked(digest):
+        raise jwt.InvalidTokenError('令牌已注销')
+    payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    _token_cache.put(digest, payload)
+    return payload
+
 def verify_token(token):
     """
     验证JWT token
@@ -24,29 +232,71 @@ def verify_token(token):
     :return: (success, payload)
     """
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-        return True, payload
+        return True, decode_token(token)
     except:
         return False, None
 
+def revoke_token(token):
+    """
+    吊销 token（登出），写入数据库中的吊销列表，所有 worker 在下次检查吊销列表时生效
+    :param token: token字符串
+    :return: (success, message)
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        # 无效或已过期的 token 本身就无法通过验证
+        return True, '令牌已失效'
+
+    digest = token_digest(token)
+    exp = payload.get('exp', time.time())
+    _token_cache.revoke(digest, exp)
+
+    from utils.database import get_db_connection, bump_data_version
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        expires_at = datetime.fromtimestamp(exp)
+        cursor.execute(
+            'INSERT IGNORE INTO revoked_tokens (digest, expires_at) VALUES (%s, %s)',
+            (digest, expires_at)
+        )
+        # 顺便清理已过期的吊销记录
+        cursor.execute('DELETE FROM revoked_tokens WHERE expires_at <= NOW()')
+        bump_data_version(cursor, 'revoked_tokens')
+        conn.commit()
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        logger.error(f"❌ 保存 token 吊销记录失败: {e}")
+        return False, f'令牌只在当前进程中注销: {e}'
+    return True, '已退出登录'
+
+def get_request_token():
+    """
+    从 Authorization 请求头中获取 token
+    :return: token字符串或None
+    """
+    header = request.headers.get('Authorization')
+    if not header:
+        return None
+    parts = header.split(' ')
+    return parts[1] if len(parts) > 1 else None
+
 def token_required(f):
     """
     鉴权中间件
     """
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        # 从请求头获取token
-        if 'Authorization' in request.headers:
-            token = request.headers['Authorization'].split(' ')[1] if len(request.headers['Authorization'].split(' ')) > 1 else None
-        
+        token = get_request_token()
+
         if not token:
             return jsonify({'success': False, 'message': '未提供认证令牌'}), 401
-        
+
         try:
-            # 解码token
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+            # 解码token（已验证的 token 直接命中缓存）
+            data = decode_token(token)
             current_user = data['username']
         except jwt.ExpiredSignatureError:
             return jsonify({'success': False, 'message': '令牌已过期'}), 401
@@ -54,6 +304,6 @@ def token_required(f):
             return jsonify({'success': False, 'message': '无效的认证令牌'}), 401
         except Exception as e:
             return jsonify({'success': False, 'message': f'认证错误: {str(e)}'}), 401
-        
+
         return f(current_user, *args, **kwargs)
     return decorated
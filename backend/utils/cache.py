@@ -0,0 +1,128 @@
+import time
+import threading
+from collections import OrderedDict
+
+class _InflightCall:
+    """
+    正在执行中的加载调用，相同key的并发请求等待同一个结果
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+        # 加载期间缓存被失效时，加载结果不再写入缓存
+        self.invalidated = False
+
+class TTLCache:
+    def __init__(self, maxsize=1024):
+        """
+        线程安全的TTL缓存，超过容量时按LRU淘汰，并对相同key的并发加载做合并（single-flight）
+        :param maxsize: 最大缓存条目数
+        """
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        读取缓存
+        :param key: 缓存key
+        :return: (hit, value)
+        """
+        with self._lock:
+            return self._get_locked(key)
+
+    def set(self, key, value, ttl):
+        """
+        写入缓存
+        :param key: 缓存key
+        :param value: 缓存值
+        :param ttl: 有效期（秒），小于等于0时不缓存
+        """
+        with self._lock:
+            self._set_locked(key, value, ttl)
+
+    def invalidate(self, key):
+        """
+        使缓存失效，正在进行中的加载结果也不会再写入缓存
+        :param key: 缓存key
+        """
+        with self._lock:
+            self._data.pop(key, None)
+            call = self._inflight.get(key)
+            if call:
+                call.invalidated = True
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._data.clear()
+            for call in self._inflight.values():
+                call.invalidated = True
+
+    def get_or_load(self, key, loader, ttl, cacheable=None):
+        """
+        读取缓存，未命中时调用loader加载
+        同一时间相同key只会执行一次loader，其余调用等待并共享结果
+        :param key: 缓存key
+        :param loader: 无参加载函数
+        :param ttl: 有效期（秒）
+        :param cacheable: 判断加载结果是否可以缓存的函数，默认全部缓存
+        :return: 缓存值或加载结果
+        """
+        with self._lock:
+            hit, value = self._get_locked(key)
+            if hit:
+                return value
+
+            call = self._inflight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InflightCall()
+                self._inflight[key] = call
+
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = loader()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                if call.error is None and not call.invalidated and (cacheable is None or cacheable(call.value)):
+                    self._set_locked(key, call.value, ttl)
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+            call.event.set()
+
+        return call.value
+
+    def _get_locked(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return False, None
+
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return False, None
+
+        self._data.move_to_end(key)
+        return True, value
+
+    def _set_locked(self, key, value, ttl):
+        if ttl <= 0:
+            return
+
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
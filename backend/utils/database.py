@@ -1,43 +1,426 @@
+import os
+import time
+import threading
+from collections import deque
 import pymysql
-from config.database import db_config
+from flask import g, has_app_context
+from config.database import db_config, pool_config
 from .logger import logger
 
+class PoolTimeoutError(pymysql.err.OperationalError):
+    """
+    连接池已满且在等待时间内没有连接被归还
+    """
+
+class PooledConnection:
+    """
+    连接池中取出的连接，close() 时归还连接池而不是断开
+    其余属性和方法（cursor、commit、rollback 等）直接转发给 pymysql 连接
+    """
+    def __init__(self, pool, conn, created_at, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        # 请求级连接由请求结束时统一归还，业务代码调用 close() 不做任何处理
+        self._request_scoped = request_scoped
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        if not self._request_scoped:
+            self.release()
+
+    def release(self):
+        """
+        回滚未提交的事务并归还连接池
+        """
+        if self._released:
+            return
+        self._released = True
+        self._pool.release(self._conn, self._created_at)
+
+    def __del__(self):
+        # 业务代码在异常分支中没有关闭连接时，对象被回收时归还，避免连接池被耗尽
+        try:
+            self.release()
+        except Exception:
+            pass
+
+class ConnectionPool:
+    def __init__(self, min_size=1, max_size=10, max_age=3600, ping_interval=5, timeout=10, **connect_kwargs):
+        """
+        线程安全的 MySQL 连接池
+        :param min_size: 最小连接数，创建连接池时预先建立
+        :param max_size: 最大连接数（空闲 + 使用中）
+        :param max_age: 连接最长使用时间（秒），超过后在取出时重建
+        :param ping_interval: 连接空闲超过该时间（秒）后，取出时先 ping 检查是否可用
+        :param timeout: 连接池已满时等待空闲连接的最长时间（秒）
+        :param connect_kwargs: 传给 pymysql.connect 的参数
+        """
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.max_age = max_age
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self.connect_kwargs = connect_kwargs
+
+        # 空闲连接按归还顺序排列，元素为 (连接, 创建时间, 归还时间)，取出时优先使用最近归还的连接
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+
+        # 统计数据
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._created = 0
+        self._discarded = 0
+        self._in_use_peak = 0
+
+    def fill(self):
+        """
+        预先建立最小数量的连接，失败时不抛出异常，后续取出时再按需建立
+        """
+        while True:
+            with self._cond:
+                if self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception as e:
+                with self._cond:
+                    self._size -= 1
+                logger.warning(f"⚠️  预先建立数据库连接失败: {e}")
+                return
+            now = time.monotonic()
+            with self._cond:
+                self._idle.append((conn, now, now))
+                self._cond.notify()
+
+    def acquire(self):
+        """
+        取出一个可用连接，连接池已满时等待其他线程归还
+        :return: (pymysql 连接, 创建时间)
+        """
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, created_at, released_at = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = self.timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeoutError(f'等待数据库连接超时（{self.timeout} 秒），连接池已满（{self.max_size}）')
+                waited = True
+                self._cond.wait(remaining)
+
+            self._checkouts += 1
+            if waited:
+                wait = time.monotonic() - started
+                self._waits += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+            self._in_use_peak = max(self._in_use_peak, self._size - len(self._idle))
+
+        # 建立和检查连接都在锁外进行，避免阻塞其他线程
+        try:
+            if conn is not None and not self._is_usable(conn, created_at, released_at):
+                self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._connect()
+                created_at = time.monotonic()
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn, created_at
+
+    def release(self, conn, created_at):
+        """
+        归还连接，未提交的事务会被回滚，避免下一个使用者看到旧的事务快照
+        :param conn: pymysql 连接
+        :param created_at: 连接创建时间
+        """
+        reusable = conn.open
+        if reusable:
+            try:
+                conn.rollback()
+            except Exception:
+                reusable = False
+        if not reusable:
+            self._discard(conn)
+
+        with self._cond:
+            if reusable:
+                self._idle.append((conn, created_at, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+
+    def stats(self):
+        """
+        获取连接池统计数据
+        :return: dict
+        """
+        with self._cond:
+            idle = len(self._idle)
+            in_use = self._size - idle
+            return {
+                'size': self._size,
+                'idle': idle,
+                'in_use': in_use,
+                'in_use_peak': self._in_use_peak,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'utilization': round(in_use / self.max_size, 4),
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_ms_total': round(self._wait_total * 1000, 2),
+                'wait_ms_avg': round(self._wait_total * 1000 / self._waits, 2) if self._waits else 0,
+                'wait_ms_max': round(self._wait_max * 1000, 2),
+                'timeouts': self._timeouts,
+                'created': self._created,
+                'discarded': self._discarded
+            }
+
+    def close(self):
+        """
+        关闭所有空闲连接
+        """
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def _connect(self):
+        conn = pymysql.connect(**self.connect_kwargs)
+        with self._cond:
+            self._created += 1
+        return conn
+
+    def _is_usable(self, conn, created_at, released_at):
+        now = time.monotonic()
+        if self.max_age and now - created_at > self.max_age:
+            return False
+        if now - released_at >= self.ping_interval:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn):
+        with self._cond:
+            self._discarded += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+# 每个进程（gunicorn worker）一个连接池，fork 之后的子进程不会复用父进程的连接
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """
+    获取当前进程的连接池
+    :return: ConnectionPool 实例
+    """
+    global _pool, _pool_pid
+
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                pool = ConnectionPool(**pool_config, **db_config)
+                pool.fill()
+                _pool = pool
+                _pool_pid = pid
+    return _pool
+
+def create_db_connection(**kwargs):
+    """
+    建立一个不经过连接池的独立连接，用于需要长期占用的场景（如持有命名锁）
+    :param kwargs: 额外的 pymysql.connect 参数
+    :return: pymysql 连接
+    """
+    return pymysql.connect(**db_config, **kwargs)
+
 def get_db_connection():
     """
     获取数据库连接
+    在请求上下文中返回当前请求共享的连接，嵌套的服务调用使用同一个连接，请求结束时归还连接池
+    在请求上下文之外（后台线程、线程池）每次从连接池取出新的连接，close() 时归还
     :return: 数据库连接对象
     """
-    return pymysql.connect(**db_config)
+    pool = get_pool()
+    if not has_app_context():
+        conn, created_at = pool.acquire()
+        return PooledConnection(pool, conn, created_at)
+
+    conn = g.get('_db_conn')
+    if conn is None:
+        raw_conn, created_at = pool.acquire()
+        conn = PooledConnection(pool, raw_conn, created_at, request_scoped=True)
+        g._db_conn = conn
+    return conn
+
+def release_request_connection(exception=None):
+    """
+    请求结束时归还当前请求共享的连接，未提交的事务会被回滚
+    """
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release()
+
+def init_db_teardown(app):
+    """
+    注册请求结束时归还数据库连接的回调
+    :param app: Flask 应用
+    """
+    app.teardown_appcontext(release_request_connection)
+
+def get_pool_stats():
+    """
+    获取当前进程的连接池统计数据
+    :return: dict
+    """
+    return get_pool().stats()
+
+def iter_chunks(items, size):
+    """
+    按固定大小切分列表
+    :param items: 列表
+    :param size: 每批数量
+    :return: 生成器，逐批返回子列表
+    """
+    size = max(1, size)
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+def bulk_insert(cursor, table, columns, rows, update_columns=None):
+    """
+    使用一条多行 INSERT 语句写入多条记录
+    指定 update_columns 时追加 ON DUPLICATE KEY UPDATE，按唯一键更新已存在的记录
+    :param cursor: 数据库游标
+    :param table: 表名
+    :param columns: 字段名列表
+    :param rows: 记录列表，每条记录为与 columns 对应的元组
+    :param update_columns: 唯一键冲突时需要更新的字段
+    :return: 影响行数
+    """
+    if not rows:
+        return 0
+    
+    row_placeholder = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES " + ', '.join([row_placeholder] * len(rows))
+    if update_columns:
+        sql += ' ON DUPLICATE KEY UPDATE ' + ', '.join(f'{column} = VALUES({column})' for column in update_columns)
+    
+    params = [value for row in rows for value in row]
+    return cursor.execute(sql, params)
+
+def bulk_update(cursor, table, key_column, columns, rows):
+    """
+    使用一条 UPDATE ... CASE 语句按主键更新多条记录，每条记录的字段值可以不同
+    :param cursor: 数据库游标
+    :param table: 表名
+    :param key_column: 主键字段名
+    :param columns: 需要更新的字段名列表
+    :param rows: 记录列表，每条记录为 (主键, 与 columns 对应的字段值...) 元组
+    :return: 影响行数
+    """
+    if not rows:
+        return 0
+    
+    set_clauses = []
+    params = []
+    for index, column in enumerate(columns, start=1):
+        cases = ' '.join(['WHEN %s THEN %s'] * len(rows))
+        set_clauses.append(f'{column} = CASE {key_column} {cases} END')
+        for row in rows:
+            params.extend([row[0], row[index]])
+    
+    placeholders = ', '.join(['%s'] * len(rows))
+    params.extend(row[0] for row in rows)
+    sql = f"UPDATE {table} SET {', '.join(set_clauses)} WHERE {key_column} IN ({placeholders})"
+    return cursor.execute(sql, params)
+
+def escape_like(value):
+    """
+    转义 LIKE 模式中的通配符，使 \\、% 和 _ 按普通字符匹配（使用 MySQL 默认的转义字符 \\）
+    :param value: 搜索关键词
+    :return: 转义后的字符串
+    """
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def ensure_column(cursor, table, column, definition):
+    """
+    字段不存在时添加字段
+    :param cursor: 数据库游标
+    :param table: 表名
+    :param column: 字段名
+    :param definition: 字段定义
+    :return: bool 是否新增了字段
+    """
+    cursor.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    if cursor.fetchone():
+        return False
+    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    logger.info(f"🛠️ 已为 {table} 表添加字段 {column}")
+    return True
+
+def bump_data_version(cursor, name='users'):
+    """
+    在当前事务中递增数据版本号，与数据修改一起提交，其他进程据此得知数据已变化
+    :param cursor: 数据库游标
+    :param name: 数据名称
+    """
+    cursor.execute('UPDATE data_versions SET version = version + 1 WHERE name = %s', (name,))
+
+def get_data_version(name='users'):
+    """
+    读取数据版本号
+    :param name: 数据名称
+    :return: int
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute('SELECT version FROM data_versions WHERE name = %s', (name,))
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return row[0] if row else 0
 
 def init_db():
     """
-    初始化数据库
+    初始化数据库：执行未执行过的迁移
+    通过 gunicorn 启动时迁移已在主进程中执行一次（见 gunicorn.conf.py），worker 进程中直接跳过
     :return: None
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # 创建用户表
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INT AUTO_INCREMENT PRIMARY KEY,
-            emby_id VARCHAR(255) UNIQUE,
-            name VARCHAR(255) NOT NULL,
-            email VARCHAR(255),
-            password VARCHAR(255),
-            is_active BOOLEAN DEFAULT TRUE,
-            state TINYINT DEFAULT 1,
-            expire_date DATETIME,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-        )
-        ''')
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info("数据库初始化成功")
-    except Exception as e:
-        logger.error(f"数据库初始化失败: {e}")
+    if os.getenv('DB_MIGRATIONS_APPLIED') == 'true':
+        return
+
+    from .migrations import run_migrations
+    success, message = run_migrations()
+    if success:
+        logger.info(f"数据库初始化成功: {message}")
+    else:
+        logger.error(f"数据库初始化失败: {message}")
         logger.warning("服务将继续运行，但数据库相关功能可能受限")
@@ -0,0 +1,463 @@
+import os
+import time
+import random
+import functools
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+import requests
+from requests.adapters import HTTPAdapter
+from config.emby import emby_config
+from utils.logger import logger
+
+class EmbyUnavailableError(requests.exceptions.ConnectionError):
+    """
+    熔断期间快速失败时抛出的异常
+    """
+
+class EmbyDeadlineExceeded(requests.exceptions.Timeout):
+    """
+    调用方的时间预算已用完时抛出的异常
+    """
+
+# 幂等的 HTTP 方法，失败后可以安全重试；其他方法需要调用方显式声明 idempotent=True
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+# 当前调用链的截止时间（time.monotonic() 时间戳），None 表示不限制
+_deadline = contextvars.ContextVar('emby_deadline', default=None)
+
+@contextmanager
+def emby_deadline(seconds):
+    """
+    为代码块内的所有 Emby 请求（包括重试）设置总的时间预算
+    嵌套使用时取更早的截止时间，内层调用不会超出外层调用方的预算
+    :param seconds: 时间预算（秒），为空时不修改当前截止时间
+    """
+    current = _deadline.get()
+    if seconds is None:
+        yield current
+        return
+    deadline = time.monotonic() + seconds
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _deadline.reset(token)
+
+def with_emby_deadline(seconds):
+    """
+    装饰器：函数内的所有 Emby 请求共用 seconds 秒的时间预算
+    :param seconds: 时间预算（秒）
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with emby_deadline(seconds):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def remaining_budget():
+    """
+    获取当前调用链剩余的时间预算
+    :return: 剩余秒数，未设置截止时间时返回 None
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+def propagate_deadline(func):
+    """
+    包装提交到线程池的函数，使其在工作线程中沿用提交时的截止时间
+    线程池中的线程不会继承调用方的 contextvars
+    :param func: 要包装的函数
+    :return: 包装后的函数
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return func
+    
+    def wrapper(*args, **kwargs):
+        token = _deadline.set(deadline)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _deadline.reset(token)
+    return wrapper
+
+class RetryPolicy:
+    def __init__(self, max_attempts=3, backoff_base=0.2, backoff_max=2.0, retry_statuses=(500, 502, 503, 504)):
+        """
+        重试策略：指数退避 + 完全抖动，只重试幂等请求
+        :param max_attempts: 最多尝试次数（包括第一次请求），1 表示不重试
+        :param backoff_base: 第一次重试前的最长等待时间（秒），之后每次翻倍
+        :param backoff_max: 单次等待时间上限（秒）
+        :param retry_statuses: 需要重试的响应状态码
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_statuses = frozenset(retry_statuses)
+    
+    def backoff(self, retry_number):
+        """
+        计算第 retry_number 次重试前的等待时间，在 0 到指数上限之间随机取值，避免多个请求同时重试
+        :param retry_number: 第几次重试，从 1 开始
+        :return: 等待秒数
+        """
+        cap = min(self.backoff_max, self.backoff_base * (2 ** (retry_number - 1)))
+        return random.uniform(0, cap)
+    
+    def is_retryable_error(self, error, idempotent):
+        """
+        判断请求异常是否可以重试
+        连接超时说明请求没有发出，任何请求都可以重试；其他连接错误和读取超时只重试幂等请求
+        :param error: 请求异常
+        :param idempotent: 请求是否幂等
+        :return: bool
+        """
+        if isinstance(error, (EmbyUnavailableError, EmbyDeadlineExceeded)):
+            return False
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        return idempotent and isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+    
+    def is_retryable_response(self, response, idempotent):
+        return idempotent and response.status_code in self.retry_statuses
+
+class RetryStats:
+    def __init__(self):
+        """
+        重试统计：请求次数、重试次数、重试耗时等，用于 /api/metrics
+        """
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.attempts = 0
+        self.retried_requests = 0
+        self.retries = 0
+        self.recovered = 0
+        self.exhausted = 0
+        self.deadline_exceeded = 0
+        self.backoff_seconds = 0.0
+        self.retry_seconds = 0.0
+        self.reasons = Counter()
+    
+    def record(self, attempts, reasons, backoff_seconds, retry_seconds, succeeded, deadline_exceeded=False):
+        """
+        记录一次请求（包括其全部重试）的结果
+        :param attempts: 实际发送的次数
+        :param reasons: 每次重试的原因列表
+        :param backoff_seconds: 退避等待的总时间
+        :param retry_seconds: 从第一次失败到最终结果的总时间
+        :param succeeded: 最终是否得到了不需要重试的结果
+        :param deadline_exceeded: 是否因时间预算用完而放弃
+        """
+        with self._lock:
+            self.requests += 1
+            self.attempts += attempts
+            self.deadline_exceeded += int(deadline_exceeded)
+            if not reasons:
+                return
+            self.retried_requests += 1
+            self.retries += len(reasons)
+            self.reasons.update(reasons)
+            self.backoff_seconds += backoff_seconds
+            self.retry_seconds += retry_seconds
+            if succeeded:
+                self.recovered += 1
+            else:
+                self.exhausted += 1
+    
+    def snapshot(self):
+        """
+        获取重试统计数据
+        :return: dict
+        """
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'attempts': self.attempts,
+                'retried_requests': self.retried_requests,
+                'retries': self.retries,
+                'recovered': self.recovered,
+                'exhausted': self.exhausted,
+                'deadline_exceeded': self.deadline_exceeded,
+                'backoff_seconds': round(self.backoff_seconds, 3),
+                'retry_seconds': round(self.retry_seconds, 3),
+                'reasons': dict(self.reasons)
+            }
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+    
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        """
+        熔断器：连续失败达到阈值后熔断，熔断期间直接拒绝请求，超时后放行一次试探请求
+        :param failure_threshold: 触发熔断的连续失败次数
+        :param reset_timeout: 熔断持续时间（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+    
+    def allow_request(self):
+        """
+        判断当前是否允许发送请求
+        :return: bool
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            # 半开状态只放行一个试探请求
+            if self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+    
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+    
+    def snapshot(self):
+        """
+        获取熔断器状态
+        :return: dict
+        """
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures}
+
+class EmbyClient:
+    def __init__(self, base_url, api_key, timeout=10, connect_timeout=5, pool_connections=4, pool_maxsize=16,
+                 breaker=None, retry=None, operation_timeouts=None):
+        """
+        初始化 Emby HTTP 客户端，所有请求共用一个带连接池的 Session（keep-alive）
+        :param base_url: Emby 服务器地址
+        :param api_key: Emby API 密钥
+        :param timeout: 默认读取超时时间（秒）
+        :param connect_timeout: 连接超时时间（秒）
+        :param pool_connections: 缓存的主机连接池数量
+        :param pool_maxsize: 单个主机连接池的最大连接数
+        :param breaker: 熔断器，默认不熔断
+        :param retry: 重试策略，默认不重试
+        :param operation_timeouts: 各操作的读取超时时间 {操作名: 秒}，未列出的操作使用默认超时
+        """
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = timeout
+        self.timeout = (connect_timeout, timeout)
+        self.breaker = breaker
+        self.retry = retry or RetryPolicy(max_attempts=1)
+        self.operation_timeouts = dict(operation_timeouts or {})
+        self.retry_stats = RetryStats()
+        
+        self.session = requests.Session()
+        # 公共认证请求头只构建一次
+        self.session.headers.update({
+            'X-Emby-Token': api_key,
+            'Accept': 'application/json'
+        })
+        
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+    
+    def url(self, path):
+        """
+        拼接完整请求地址
+        :param path: 以 / 开头的接口路径，如 /emby/Users
+        :return: 完整URL
+        """
+        return f"{self.base_url}{path}"
+    
+    def request(self, method, path, operation=None, idempotent=None, **kwargs):
+        """
+        发送请求，按重试策略重试可重试的失败，所有尝试和退避等待都不会超出当前调用链的截止时间
+        连接错误、超时和5xx响应计为失败，熔断期间直接抛出 EmbyUnavailableError
+        :param method: HTTP 方法
+        :param path: 接口路径
+        :param operation: 操作名，用于选择读取超时时间（见 EMBY_OPERATION_TIMEOUTS）
+        :param idempotent: 请求是否幂等，默认按 HTTP 方法判断；设置绝对值的 POST（如更新策略）可以显式声明
+        :return: requests.Response
+        """
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+        timeout = kwargs.pop('timeout', None) or (self.connect_timeout, self.operation_timeouts.get(operation, self.read_timeout))
+        
+        attempts = 0
+        reasons = []
+        backoff_seconds = 0.0
+        first_failure = None
+        while True:
+            attempts += 1
+            try:
+                response = self._send(method, path, self._bounded_timeout(timeout), **kwargs)
+            except requests.exceptions.RequestException as e:
+                error, response = e, None
+                if isinstance(e, EmbyDeadlineExceeded):
+                    # 预算用完时请求没有发出
+                    attempts -= 1
+                retryable = self.retry.is_retryable_error(e, idempotent)
+                reason = type(e).__name__
+            else:
+                error = None
+                retryable = self.retry.is_retryable_response(response, idempotent)
+                reason = f'HTTP {response.status_code}'
+            
+            if not retryable:
+                return self._finish(response, error, attempts, reasons, backoff_seconds, first_failure)
+            
+            now = time.monotonic()
+            if first_failure is None:
+                first_failure = now
+            delay = self.retry.backoff(attempts)
+            remaining = remaining_budget()
+            # 已达最多尝试次数，或等待后剩余的预算不够再发送一次请求时放弃
+            if attempts >= self.retry.max_attempts or (remaining is not None and remaining - delay <= 0):
+                return self._finish(response, error, attempts, reasons, backoff_seconds, first_failure,
+                                    exhausted=True, deadline_exceeded=attempts < self.retry.max_attempts)
+            
+            if response is not None:
+                response.close()
+            reasons.append(reason)
+            time.sleep(delay)
+            backoff_seconds += delay
+    
+    def _send(self, method, path, timeout, **kwargs):
+        """
+        发送一次请求并更新熔断器状态
+        """
+        if self.breaker is None:
+            return self.session.request(method, self.url(path), timeout=timeout, **kwargs)
+        
+        if not self.breaker.allow_request():
+            raise EmbyUnavailableError('Emby服务器暂不可用（已熔断），请稍后重试')
+        try:
+            response = self.session.request(method, self.url(path), timeout=timeout, **kwargs)
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+    
+    def _bounded_timeout(self, timeout):
+        """
+        将本次尝试的超时时间限制在剩余预算之内
+        :param timeout: 超时时间，秒数或 (连接超时, 读取超时)
+        :return: 限制后的超时时间
+        """
+        remaining = remaining_budget()
+        if remaining is None:
+            return timeout
+        if remaining <= 0:
+            raise EmbyDeadlineExceeded('Emby请求的时间预算已用完')
+        if isinstance(timeout, tuple):
+            return tuple(min(value, remaining) if value is not None else remaining for value in timeout)
+        return min(timeout, remaining) if timeout is not None else remaining
+    
+    def _finish(self, response, error, attempts, reasons, backoff_seconds, first_failure, exhausted=False, deadline_exceeded=False):
+        """
+        记录重试统计并返回最终结果（响应或异常）
+        """
+        retry_seconds = time.monotonic() - first_failure if reasons else 0.0
+        deadline_exceeded = deadline_exceeded or isinstance(error, EmbyDeadlineExceeded)
+        self.retry_stats.record(attempts, reasons, backoff_seconds, retry_seconds, not exhausted and error is None,
+                                deadline_exceeded=deadline_exceeded)
+        if reasons:
+            outcome = f'状态码 {response.status_code}' if response is not None else type(error).__name__
+            logger.warning(f"🔁 Emby 请求重试 {len(reasons)} 次后结束: {outcome}（原因: {', '.join(reasons)}）")
+        if error is not None:
+            raise error
+        return response
+    
+    def stats(self):
+        """
+        获取客户端运行指标：重试统计和熔断器状态
+        :return: dict
+        """
+        return {
+            'retry': self.retry_stats.snapshot(),
+            'breaker': self.breaker.snapshot() if self.breaker else None
+        }
+    
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+    
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+    
+    def delete(self, path, **kwargs):
+        return self.request('DELETE', path, **kwargs)
+    
+    def close(self):
+        """
+        关闭连接池
+        """
+        self.session.close()
+
+# 每个进程（gunicorn worker）一个客户端实例
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def get_emby_client():
+    """
+    获取当前进程共享的 Emby 客户端
+    fork 之后的子进程不会复用父进程的连接，而是重新创建客户端
+    :return: EmbyClient 实例
+    """
+    global _client, _client_pid
+    
+    pid = os.getpid()
+    if _client is None or _client_pid != pid:
+        with _client_lock:
+            if _client is None or _client_pid != pid:
+                _client = EmbyClient(
+                    emby_config['url'],
+                    emby_config['api_key'],
+                    timeout=emby_config['timeout'],
+                    connect_timeout=emby_config['connect_timeout'],
+                    pool_connections=emby_config['pool_connections'],
+                    pool_maxsize=emby_config['pool_maxsize'],
+                    breaker=CircuitBreaker(
+                        failure_threshold=emby_config['breaker_failure_threshold'],
+                        reset_timeout=emby_config['breaker_reset_timeout']
+                    ),
+                    retry=RetryPolicy(
+                        max_attempts=emby_config['retry_max_attempts'],
+                        backoff_base=emby_config['retry_backoff_base'],
+                        backoff_max=emby_config['retry_backoff_max'],
+                        retry_statuses=emby_config['retry_statuses']
+                    ),
+                    operation_timeouts=emby_config['operation_timeouts']
+                )
+                _client_pid = pid
+    return _client
@@ -0,0 +1,77 @@
+import json
+import uuid
+import decimal
+import datetime
+import dataclasses
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default(obj):
+    """
+    处理 orjson 不能直接序列化的类型
+    """
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', errors='replace')
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def _fallback_default(obj):
+    """
+    未安装 orjson 时使用标准库 json，日期时间同样输出为 ISO 8601 格式，保证两种实现的输出一致
+    """
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    return _default(obj)
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    基于 orjson 的 JSON 序列化，datetime、date、UUID、dataclass 由 orjson 原生编码
+    日期时间输出为 ISO 8601 格式（如 2026-02-20T01:45:00），未安装 orjson 时回退到标准库 json
+    """
+    default = staticmethod(_fallback_default)
+    # 回退到标准库 json 时与 orjson 的输出保持一致：不排序 key，不转义非 ASCII 字符
+    sort_keys = False
+    ensure_ascii = False
+
+    # 非字符串 key（如 int）转为字符串，与标准库 json 行为一致
+    option = orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=self.option).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        # 直接使用 orjson 输出的 bytes，避免再编码一次
+        return self._app.response_class(orjson.dumps(obj, default=_default, option=self.option), mimetype=self.mimetype)
+
+def dumps_bytes(obj):
+    """
+    序列化为 UTF-8 编码的 JSON，供不在应用上下文中的代码（如流式响应的生成器）使用
+    :param obj: 要序列化的对象
+    :return: bytes
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=FastJSONProvider.option)
+    return json.dumps(obj, default=_fallback_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
@@ -1,6 +1,342 @@
 import os
+import re
+import gzip
+import json
+import time
+import queue
+import shutil
+import atexit
 import logging
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+# 日志级别，设置为 INFO 及以上时不会格式化和写入 debug 日志
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG').upper()
+# 请求/响应内容日志的最大字节数，超出部分截断，0 表示不截断
+LOG_PAYLOAD_MAX_BYTES = int(os.getenv('LOG_PAYLOAD_MAX_BYTES', '4096'))
+# 日志队列配置：队列容量，队列满时的处理策略（drop / block），以及最长等待时间（秒）
+# drop：丢弃 WARNING 以下的日志，WARNING 及以上的日志最多等待 LOG_QUEUE_BLOCK_TIMEOUT 秒
+# block：所有日志都最多等待 LOG_QUEUE_BLOCK_TIMEOUT 秒，超时后丢弃
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+LOG_QUEUE_OVERFLOW = os.getenv('LOG_QUEUE_OVERFLOW', 'drop').lower()
+LOG_QUEUE_BLOCK_TIMEOUT = float(os.getenv('LOG_QUEUE_BLOCK_TIMEOUT', '0.5'))
+# 日志保留配置：保留天数、日志目录总大小上限（MB，0 表示不限制），以及是否压缩两天前的日志
+LOG_RETENTION_DAYS = int(os.getenv('LOG_RETENTION_DAYS', '14'))
+LOG_RETENTION_MAX_MB = float(os.getenv('LOG_RETENTION_MAX_MB', '500'))
+LOG_COMPRESS = os.getenv('LOG_COMPRESS', 'true').lower() == 'true'
+
+# 按日期命名的日志文件：<前缀>-YYYY-MM-DD.log，压缩后为 .log.gz
+LOG_DATE_FORMAT = '%Y-%m-%d'
+LOG_FILE_PATTERN = re.compile(r'^(?P<prefix>.+)-(?P<date>\d{4}-\d{2}-\d{2})\.log(?P<gz>\.gz)?$')
+
+def get_log_dir():
+    """
+    获取日志根目录：优先使用 LOG_DIR 环境变量，默认为 backend/logs
+    :return: 目录路径
+    """
+    env_log_dir = os.getenv('LOG_DIR')
+    if env_log_dir:
+        return env_log_dir
+    # 获取当前文件所在目录的父目录，即backend目录
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(backend_dir, 'logs')
+
+def dated_log_file(directory, prefix, date=None):
+    """
+    获取某一天的日志文件路径
+    :param directory: 日志文件所在目录
+    :param prefix: 文件名前缀
+    :param date: 日期字符串（YYYY-MM-DD），默认为今天
+    :return: 文件路径
+    """
+    date = date or datetime.now().strftime(LOG_DATE_FORMAT)
+    return os.path.join(directory, f'{prefix}-{date}.log')
+
+def get_plugin_log_dir(plugin_name):
+    return os.path.join(get_log_dir(), 'plugins', plugin_name)
+
+def get_latest_log_file(directory, prefix):
+    """
+    获取最新的日志文件：今天的文件存在时返回今天的文件，否则返回最近一天未压缩的文件
+    :param directory: 日志文件所在目录
+    :param prefix: 文件名前缀
+    :return: 文件路径，没有日志文件时返回今天的文件路径
+    """
+    current = dated_log_file(directory, prefix)
+    if os.path.exists(current) or not os.path.isdir(directory):
+        return current
+    dates = []
+    for name in os.listdir(directory):
+        match = LOG_FILE_PATTERN.match(name)
+        if match and match['prefix'] == prefix and not match['gz']:
+            dates.append(match['date'])
+    return dated_log_file(directory, prefix, max(dates)) if dates else current
+
+class DailyFileHandler(logging.FileHandler):
+    def __init__(self, directory, prefix, encoding='utf-8'):
+        """
+        按天切换的日志文件处理器，写入时根据日志记录的时间选择 <前缀>-YYYY-MM-DD.log
+        长时间运行的进程跨过零点后自动写入新一天的文件，并在后台压缩和清理旧日志
+        :param directory: 日志文件所在目录
+        :param prefix: 文件名前缀
+        :param encoding: 文件编码
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.prefix = prefix
+        self.current_date = datetime.now().strftime(LOG_DATE_FORMAT)
+        super().__init__(dated_log_file(directory, prefix, self.current_date), encoding=encoding, delay=True)
+
+    def emit(self, record):
+        date = datetime.fromtimestamp(record.created).strftime(LOG_DATE_FORMAT)
+        # 零点前产生、零点后才写入的日志仍写入当前文件，只向后切换
+        if date > self.current_date:
+            self.rollover(date)
+        super().emit(record)
+
+    def rollover(self, date):
+        """
+        切换到新一天的日志文件
+        :param date: 日期字符串（YYYY-MM-DD）
+        """
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        self.current_date = date
+        self.baseFilename = os.path.abspath(dated_log_file(self.directory, self.prefix, date))
+        os.makedirs(self.directory, exist_ok=True)
+        schedule_log_maintenance()
+
+def compress_log_file(path):
+    """
+    gzip 压缩日志文件并删除原文件
+    先写入临时文件再重命名，多个进程同时压缩同一个文件时不会得到不完整的压缩文件
+    :param path: 日志文件路径
+    :return: 压缩后的文件路径，原文件已不存在时返回 None
+    """
+    gz_path = f'{path}.gz'
+    tmp_path = f'{gz_path}.{os.getpid()}.tmp'
+    try:
+        with open(path, 'rb') as source, gzip.open(tmp_path, 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.replace(tmp_path, gz_path)
+        os.remove(path)
+    except FileNotFoundError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return gz_path if os.path.exists(gz_path) else None
+    return gz_path
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def maintain_log_dir(log_dir=None, retention_days=LOG_RETENTION_DAYS, max_mb=LOG_RETENTION_MAX_MB, compress=LOG_COMPRESS):
+    """
+    维护日志目录（包括插件日志子目录）：压缩两天前的日志，删除超过保留天数的日志，
+    总大小超过上限时从最旧的日志开始删除，今天的日志不会被删除
+    昨天的日志不压缩，其他进程可能还在写入跨零点的最后几条日志
+    :param log_dir: 日志根目录，默认为 get_log_dir()
+    :param retention_days: 保留天数，0 表示不按天数清理
+    :param max_mb: 总大小上限（MB），0 表示不限制
+    :param compress: 是否压缩旧日志
+    :return: dict 压缩、删除的文件数和剩余总大小
+    """
+    log_dir = log_dir or get_log_dir()
+    today = datetime.now().date()
+    result = {'compressed': 0, 'removed': 0, 'total_bytes': 0}
+    files = []
+
+    for root, _, names in os.walk(log_dir):
+        for name in names:
+            path = os.path.join(root, name)
+            # 清理压缩中断留下的临时文件
+            if name.endswith('.tmp') and '.log.gz.' in name:
+                if time.time() - os.path.getmtime(path) > 3600:
+                    _remove_file(path)
+                continue
+
+            match = LOG_FILE_PATTERN.match(name)
+            if not match:
+                continue
+            try:
+                date = datetime.strptime(match['date'], LOG_DATE_FORMAT).date()
+            except ValueError:
+                continue
+            age = (today - date).days
+
+            if retention_days and age >= retention_days:
+                _remove_file(path)
+                result['removed'] += 1
+                continue
+            if compress and not match['gz'] and age >= 2:
+                path = compress_log_file(path)
+                if path is None:
+                    continue
+                result['compressed'] += 1
+            try:
+                files.append((date, path, os.path.getsize(path)))
+            except FileNotFoundError:
+                continue
+
+    total = sum(size for _, _, size in files)
+    max_bytes = int(max_mb * 1024 * 1024)
+    if max_bytes:
+        for date, path, size in sorted(files):
+            if total <= max_bytes or date >= today:
+                break
+            _remove_file(path)
+            result['removed'] += 1
+            total -= size
+    result['total_bytes'] = total
+    return result
+
+_maintenance_lock = threading.Lock()
+
+def _run_log_maintenance():
+    if not _maintenance_lock.acquire(blocking=False):
+        return
+    try:
+        result = maintain_log_dir()
+        if result['compressed'] or result['removed']:
+            logging.getLogger(__name__).info(
+                f"🧹 日志维护完成: 压缩 {result['compressed']} 个，删除 {result['removed']} 个，剩余 {result['total_bytes'] / 1024 / 1024:.1f} MB"
+            )
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"⚠️  日志维护失败: {e}")
+    finally:
+        _maintenance_lock.release()
+
+def _reset_maintenance_lock():
+    global _maintenance_lock
+    # fork 时维护线程可能正持有锁，子进程中没有该线程，重新创建
+    _maintenance_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_maintenance_lock)
+
+def schedule_log_maintenance():
+    """
+    在后台线程中维护日志目录，同一进程中同时只有一个维护任务
+    """
+    threading.Thread(target=_run_log_maintenance, name='log-maintenance', daemon=True).start()
+
+class _FlushingQueueListener(QueueListener):
+    """
+    停止时阻塞等待放入结束标记，保证队列满时也能处理完剩余日志
+    """
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+class BoundedQueueHandler(QueueHandler):
+    def __init__(self, handlers, maxsize=10000, overflow='drop', block_timeout=0.5):
+        """
+        非阻塞日志处理器：调用线程只把日志记录放入有界队列，格式化和文件/控制台写入由后台监听线程完成
+        :param handlers: 实际写入日志的处理器列表
+        :param maxsize: 队列容量
+        :param overflow: 队列满时的处理策略（drop / block）
+        :param block_timeout: 队列满时最长等待时间（秒）
+        """
+        super().__init__(queue.Queue(maxsize))
+        self.handlers = handlers
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.listener = None
+        self.dropped = 0
+        self._unreported = 0
+
+    def start_listener(self):
+        self.listener = _FlushingQueueListener(self.queue, *self.handlers, respect_handler_level=True)
+        self.listener.start()
+
+    def stop_listener(self):
+        """
+        停止监听线程，停止前写完队列中的所有日志
+        """
+        listener, self.listener = self.listener, None
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+        for handler in self.handlers:
+            handler.flush()
+
+    def reset_after_fork(self):
+        """
+        fork 后的子进程中没有父进程的监听线程，使用新的队列重新启动
+        """
+        self.queue = queue.Queue(self.maxsize)
+        self.dropped = 0
+        self._unreported = 0
+        self.start_listener()
+
+    def prepare(self, record):
+        # 同一进程内的队列不需要序列化，日志记录原样交给监听线程格式化
+        return record
+
+    def enqueue(self, record):
+        timeout = self.block_timeout if self.overflow == 'block' or record.levelno >= logging.WARNING else 0
+        try:
+            if timeout > 0:
+                self.queue.put(record, timeout=timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+            return
+
+        # 队列恢复后补记一条丢弃日志的警告
+        if self._unreported:
+            notice = logging.makeLogRecord({
+                'name': record.name,
+                'levelno': logging.WARNING,
+                'levelname': 'WARNING',
+                'msg': f"⚠️  日志队列已满，丢弃了 {self._unreported} 条日志",
+            })
+            try:
+                self.queue.put_nowait(notice)
+                self._unreported = 0
+            except queue.Full:
+                pass
+
+    def stats(self):
+        return {
+            'queued': self.queue.qsize(),
+            'maxsize': self.maxsize,
+            'dropped': self.dropped
+        }
+
+# 当前进程中所有的日志队列处理器，用于退出时写完剩余日志和 fork 后重启监听线程
+_queue_handlers = []
+_queue_handlers_lock = threading.Lock()
+
+def _stop_queue_handlers():
+    with _queue_handlers_lock:
+        handlers = list(_queue_handlers)
+    for handler in handlers:
+        handler.stop_listener()
+
+def _restart_queue_handlers():
+    global _queue_handlers_lock
+    # fork 时锁可能正被其他线程持有，子进程中重新创建
+    _queue_handlers_lock = threading.Lock()
+    for handler in _queue_handlers:
+        handler.reset_after_fork()
+
+atexit.register(_stop_queue_handlers)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_queue_handlers)
+
+def get_log_stats():
+    """
+    获取日志队列统计数据
+    :return: {日志记录器名称: 队列统计}
+    """
+    with _queue_handlers_lock:
+        return {handler.name: handler.stats() for handler in _queue_handlers}
 
 class Logger:
     def __init__(self, name, log_dir=None, is_plugin=False, plugin_name=None):
@@ -11,53 +347,35 @@ class Logger:
         :param is_plugin: 是否为插件日志
         :param plugin_name: 插件名称，当is_plugin为True时必填
         """
-        # 优先从环境变量获取日志目录
-        env_log_dir = os.getenv('LOG_DIR')
-        
-        # 如果没有指定日志目录，使用默认目录
-        if log_dir is None:
-            if env_log_dir:
-                self.log_dir = env_log_dir
-            else:
-                # 获取当前文件所在目录的父目录，即backend目录
-                backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                self.log_dir = os.path.join(backend_dir, 'logs')
-        else:
-            self.log_dir = log_dir
+        # 如果没有指定日志目录，使用 LOG_DIR 环境变量或默认目录
+        self.log_dir = log_dir or get_log_dir()
         
         # 确保日志目录存在
         if not os.path.exists(self.log_dir):
             os.makedirs(self.log_dir)
         
-        # 确保插件日志目录存在
-        if is_plugin and plugin_name:
-            plugin_log_dir = os.path.join(self.log_dir, 'plugins', plugin_name)
-            if not os.path.exists(plugin_log_dir):
-                os.makedirs(plugin_log_dir)
-        
-        # 获取当前日期，用于日志文件名
-        current_date = datetime.now().strftime('%Y-%m-%d')
-        
         # 创建日志记录器
         self.logger = logging.getLogger(name)
-        self.logger.setLevel(logging.DEBUG)
+        self.logger.setLevel(getattr(logging, LOG_LEVEL, logging.DEBUG))
         
         # 清除已有的处理器，避免重复
         if self.logger.handlers:
+            for handler in self.logger.handlers:
+                if isinstance(handler, BoundedQueueHandler):
+                    handler.stop_listener()
+                    with _queue_handlers_lock:
+                        _queue_handlers.remove(handler)
             self.logger.handlers.clear()
         
-        # 创建总日志文件处理器（所有日志都会记录到这里）
-        all_log_file = os.path.join(self.log_dir, f'all-{current_date}.log')
-        all_file_handler = logging.FileHandler(all_log_file, encoding='utf-8')
+        # 创建总日志文件处理器（所有日志都会记录到这里），按天切换文件
+        all_file_handler = DailyFileHandler(self.log_dir, 'all')
         all_file_handler.setLevel(logging.DEBUG)
         
         # 创建特定日志文件处理器
         if is_plugin and plugin_name:
-            plugin_log_file = os.path.join(self.log_dir, 'plugins', plugin_name, f'{plugin_name}-{current_date}.log')
-            specific_file_handler = logging.FileHandler(plugin_log_file, encoding='utf-8')
+            specific_file_handler = DailyFileHandler(os.path.join(self.log_dir, 'plugins', plugin_name), plugin_name)
         else:
-            specific_log_file = os.path.join(self.log_dir, f'{name}-{current_date}.log')
-            specific_file_handler = logging.FileHandler(specific_log_file, encoding='utf-8')
+            specific_file_handler = DailyFileHandler(self.log_dir, name)
         
         specific_file_handler.setLevel(logging.DEBUG)
         
@@ -75,10 +393,18 @@ class Logger:
         specific_file_handler.setFormatter(formatter)
         console_handler.setFormatter(formatter)
         
-        # 添加处理器到日志记录器
-        self.logger.addHandler(all_file_handler)
-        self.logger.addHandler(specific_file_handler)
-        self.logger.addHandler(console_handler)
+        # 日志记录器只挂载队列处理器，文件和控制台写入在后台监听线程中完成，请求线程不等待磁盘IO
+        queue_handler = BoundedQueueHandler(
+            [all_file_handler, specific_file_handler, console_handler],
+            maxsize=LOG_QUEUE_SIZE,
+            overflow=LOG_QUEUE_OVERFLOW,
+            block_timeout=LOG_QUEUE_BLOCK_TIMEOUT
+        )
+        queue_handler.set_name(name)
+        queue_handler.start_listener()
+        with _queue_handlers_lock:
+            _queue_handlers.append(queue_handler)
+        self.logger.addHandler(queue_handler)
     
     def debug(self, message):
         """
@@ -87,6 +413,32 @@ class Logger:
         """
         self.logger.debug(message)
     
+    def payload(self, label, content):
+        """
+        输出debug级别的请求/响应内容
+        只有启用了debug级别时才会格式化，超过 LOG_PAYLOAD_MAX_BYTES 的内容会被截断
+        :param label: 日志前缀
+        :param content: 原始响应字节、字符串或可JSON序列化的请求数据
+        """
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        
+        if isinstance(content, (bytes, bytearray)):
+            # 原始字节直接解码，不再做JSON解析和美化
+            size = len(content)
+            if LOG_PAYLOAD_MAX_BYTES and size > LOG_PAYLOAD_MAX_BYTES:
+                content = content[:LOG_PAYLOAD_MAX_BYTES]
+            text = bytes(content).decode('utf-8', errors='replace')
+        else:
+            if not isinstance(content, str):
+                content = json.dumps(content, ensure_ascii=False, default=str)
+            size = len(content)
+            text = content[:LOG_PAYLOAD_MAX_BYTES] if LOG_PAYLOAD_MAX_BYTES else content
+        
+        if LOG_PAYLOAD_MAX_BYTES and size > LOG_PAYLOAD_MAX_BYTES:
+            text += f' ...（已截断，原始长度 {size}）'
+        self.logger.debug(f"{label}: {text}")
+    
     def info(self, message):
         """
         输出info级别的日志
@@ -118,6 +470,9 @@ class Logger:
 # 创建默认的日志记录器实例
 logger = Logger(__name__)
 
+# 启动时维护一次日志目录，之后在每次切换到新一天的文件时维护
+schedule_log_maintenance()
+
 # 创建插件日志记录器的工厂函数
 def get_plugin_logger(plugin_name):
     """
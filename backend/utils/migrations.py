@@ -0,0 +1,221 @@
+import time
+from .database import create_db_connection, ensure_column
+from .logger import logger
+
+# 用于保证同一时间只有一个进程执行迁移的 MySQL 命名锁
+MIGRATION_LOCK_NAME = 'emby_manager.migrations'
+
+def ensure_index(cursor, table, index, columns):
+    """
+    索引不存在时创建索引
+    :param cursor: 数据库游标
+    :param table: 表名
+    :param index: 索引名
+    :param columns: 索引字段列表
+    :return: bool 是否新建了索引
+    """
+    cursor.execute(f"SHOW INDEX FROM {table} WHERE Key_name = %s", (index,))
+    if cursor.fetchone():
+        return False
+    cursor.execute(f"CREATE INDEX {index} ON {table} ({', '.join(columns)})")
+    logger.info(f"🛠️ 已为 {table} 表创建索引 {index} ({', '.join(columns)})")
+    return True
+
+def create_users_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        id INT AUTO_INCREMENT PRIMARY KEY,
+        emby_id VARCHAR(255) UNIQUE,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255),
+        password VARCHAR(255),
+        is_active BOOLEAN DEFAULT TRUE,
+        state TINYINT DEFAULT 1,
+        expire_date DATETIME,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+    )
+    ''')
+
+def add_users_fingerprint(cursor):
+    ensure_column(cursor, 'users', 'fingerprint', 'CHAR(40) NULL AFTER state')
+
+def add_users_emby_policy(cursor):
+    ensure_column(cursor, 'users', 'emby_policy', 'TEXT NULL AFTER fingerprint')
+
+def add_users_expire_index(cursor):
+    # 对应过期检查和过期调度：WHERE state = 1 AND is_active = TRUE AND expire_date < ...
+    # 也覆盖用户列表按状态和过期状态的筛选
+    ensure_index(cursor, 'users', 'idx_users_state_active_expire', ['state', 'is_active', 'expire_date'])
+
+def add_users_list_index(cursor):
+    # 对应用户列表：WHERE state = 1 ... ORDER BY id，按索引顺序读取，无需 filesort
+    ensure_index(cursor, 'users', 'idx_users_state_id', ['state', 'id'])
+
+def create_data_versions_table(cursor):
+    # 数据版本号，用户表的每次修改都在同一事务中递增，各进程的内存数据据此判断是否需要重新加载
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS data_versions (
+        name VARCHAR(64) PRIMARY KEY,
+        version BIGINT NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute("INSERT IGNORE INTO data_versions (name, version) VALUES ('users', 0)")
+
+def create_revoked_tokens_table(cursor):
+    # 已吊销（登出）的 token，只保存摘要，过期后可以删除
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS revoked_tokens (
+        digest CHAR(64) PRIMARY KEY,
+        expires_at DATETIME NOT NULL,
+        revoked_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_revoked_tokens_expires_at (expires_at)
+    )
+    ''')
+    cursor.execute("INSERT IGNORE INTO data_versions (name, version) VALUES ('revoked_tokens', 0)")
+
+def create_import_journal_table(cursor):
+    # 导入用户的续传标记：在 Emby 中创建用户前写入，用户写入 users 表时删除
+    # 重新导入时只接管有标记的同名 Emby 用户，不会接管 Emby 中原有的账号
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS import_journal (
+        name VARCHAR(255) PRIMARY KEY,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+# 按版本号顺序执行的迁移，每个迁移都必须可以重复执行
+# 已发布的迁移不要修改，新的表结构变更追加新版本
+MIGRATIONS = [
+    (1, '创建用户表', create_users_table),
+    (2, '用户表增加同步指纹字段', add_users_fingerprint),
+    (3, '用户表增加 Emby 策略字段', add_users_emby_policy),
+    (4, '用户表增加过期检查索引', add_users_expire_index),
+    (5, '用户表增加列表排序索引', add_users_list_index),
+    (6, '创建数据版本号表', create_data_versions_table),
+    (7, '创建 token 吊销表', create_revoked_tokens_table),
+    (8, '创建导入续传标记表', create_import_journal_table),
+]
+
+def ensure_migrations_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        duration_ms INT,
+        applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+def get_applied_versions(cursor):
+    """
+    获取已执行的迁移版本
+    :param cursor: 数据库游标
+    :return: set
+    """
+    cursor.execute('SELECT version FROM schema_migrations')
+    return {row[0] for row in cursor.fetchall()}
+
+def run_migrations(lock_timeout=60):
+    """
+    按顺序执行未执行过的迁移
+    多个进程同时启动时通过 MySQL 命名锁串行执行，后拿到锁的进程看到迁移已完成后直接返回
+    :param lock_timeout: 等待迁移锁的最长时间（秒）
+    :return: (success, message)
+    """
+    conn = None
+    try:
+        # DDL 在 MySQL 中会隐式提交，迁移使用自动提交的独立连接
+        conn = create_db_connection(autocommit=True)
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT GET_LOCK(%s, %s)', (MIGRATION_LOCK_NAME, lock_timeout))
+        if cursor.fetchone()[0] != 1:
+            return False, f'等待迁移锁超时（{lock_timeout} 秒）'
+
+        try:
+            ensure_migrations_table(cursor)
+            applied = get_applied_versions(cursor)
+            pending = [migration for migration in MIGRATIONS if migration[0] not in applied]
+
+            for version, name, migrate in pending:
+                started = time.perf_counter()
+                logger.info(f"🛠️ 执行数据库迁移 {version}: {name}")
+                migrate(cursor)
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                cursor.execute(
+                    'INSERT INTO schema_migrations (version, name, duration_ms) VALUES (%s, %s, %s)',
+                    (version, name, duration_ms)
+                )
+        finally:
+            cursor.execute('SELECT RELEASE_LOCK(%s)', (MIGRATION_LOCK_NAME,))
+            cursor.close()
+
+        if pending:
+            return True, f'已执行 {len(pending)} 个数据库迁移，当前版本 {pending[-1][0]}'
+        return True, '数据库已是最新版本'
+    except Exception as e:
+        return False, str(e)
+    finally:
+        if conn is not None:
+            conn.close()
+
+def get_migration_status():
+    """
+    获取迁移执行状态
+    :return: list，每个迁移包含 version、name、applied_at
+    """
+    conn = create_db_connection()
+    try:
+        cursor = conn.cursor()
+        ensure_migrations_table(cursor)
+        cursor.execute('SELECT version, applied_at FROM schema_migrations')
+        applied = dict(cursor.fetchall())
+        cursor.close()
+    finally:
+        conn.close()
+
+    return [
+        {'version': version, 'name': name, 'applied_at': applied.get(version)}
+        for version, name, _ in MIGRATIONS
+    ]
+
+# 热点查询，用于检查索引是否生效，参数为示例值
+HOT_QUERIES = [
+    ('用户列表', 'SELECT id FROM users WHERE state = 1 ORDER BY id LIMIT 10', ()),
+    ('用户列表（按状态筛选）', 'SELECT id FROM users WHERE state = 1 AND is_active = %s ORDER BY id LIMIT 10', (True,)),
+    ('用户列表（已过期）', 'SELECT id FROM users WHERE state = 1 AND expire_date < NOW() ORDER BY id LIMIT 10', ()),
+    ('用户总数', 'SELECT COUNT(*) FROM users WHERE state = 1', ()),
+    ('过期检查', 'SELECT id FROM users WHERE expire_date < NOW() AND is_active = TRUE AND state = 1', ()),
+    ('过期调度', 'SELECT id, expire_date FROM users WHERE state = 1 AND is_active = TRUE AND expire_date < NOW() + INTERVAL %s SECOND', (120,)),
+]
+
+def explain_hot_queries():
+    """
+    对热点查询执行 EXPLAIN，检查是否使用了索引
+    :return: list，每个查询包含 name、table、type、key、rows、extra、full_scan
+    """
+    conn = create_db_connection()
+    results = []
+    try:
+        cursor = conn.cursor()
+        for name, sql, params in HOT_QUERIES:
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            row = dict(zip(columns, cursor.fetchone()))
+            full_scan = row.get('type') == 'ALL'
+            results.append({
+                'name': name,
+                'table': row.get('table'),
+                'type': row.get('type'),
+                'key': row.get('key'),
+                'rows': row.get('rows'),
+                'extra': row.get('Extra'),
+                'full_scan': full_scan
+            })
+            if full_scan:
+                logger.warning(f"⚠️  热点查询未使用索引: {name} (type={row.get('type')}, rows={row.get('rows')})")
+        cursor.close()
+    finally:
+        conn.close()
+    return results